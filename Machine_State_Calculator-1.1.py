@@ -1,312 +1,339 @@
 import sys
 import os
-from markdown import markdown
-import pandas as pd
-from datetime import time
-from collections import defaultdict
+import json
+import threading
+import importlib
 from PyQt5.QtWidgets import (QApplication, QWidget, QVBoxLayout, QPushButton, QTreeView, QActionGroup, 
-                             QFileDialog, QHBoxLayout, QLabel, QTextEdit, QHeaderView, QProgressBar, QAction, QMessageBox, QMainWindow, QTextBrowser)
-from PyQt5.QtGui import QStandardItemModel, QStandardItem, QFont, QColor, QIcon, QPixmap
-from PyQt5.QtCore import Qt, QSize, QCoreApplication
+                             QFileDialog, QHBoxLayout, QLabel, QTextEdit, QHeaderView, QProgressBar, QAction, QMessageBox, QMainWindow, QTextBrowser,
+                             QDateEdit, QToolButton, QMenu)
+from PyQt5.QtGui import QFont, QColor, QIcon, QPixmap
+from PyQt5.QtCore import Qt, QSize, QThread, QTimer, QDate, QDateTime, QAbstractItemModel, QModelIndex, pyqtSignal
 
-def summarize_machine_entries_with_exclusion(updated_data):
+# machine_state_core (numpy and pandas) and markdown are imported when first needed, so the
+# window paints without waiting for them; see benchmarks/startup_benchmark.py
+
+def preload_pipeline():
+    """ Imports machine_state_core on a background thread, ahead of the first Calculate. """
+    threading.Thread(target=importlib.import_module, args=('machine_state_core',), daemon=True).start()
+
+class CalculationWorker(QThread):
     """
-    Goes through machine entries (already annotated with shift codes, breaks, etc.)
-    and:
-    1) Sums durations for each machine state per shift code (result).
-    2) Tracks jam counts in two ways:
-       - jam_count_by_shift[shift_code][machine] = number of jam events for that shift
-       - overall_jam_count[machine] = total jam events across all shifts
-
-    A "jam" = a valid consecutive ERROR block under 1 hour,
-    not interrupted by breaks/shift crossovers.
+    Runs the calculation for CSVSummarizerApp off the GUI thread. Progress is reported per
+    row through signals, and requestInterruption() cancels at the next progress report.
     """
-    from collections import defaultdict
-
-    # Durations for each shift_code -> machine -> state
-    result = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
-
-    # Jam counts:
-    jam_count_by_shift = defaultdict(lambda: defaultdict(int))
-    overall_jam_count = defaultdict(int)
-
-    skip_consecutive_errors = defaultdict(bool)
-    error_entries_buffer = defaultdict(list)
-    error_duration_buffer = defaultdict(float)
-
-    for machine, entries in updated_data.items():
-        for entry in entries:
-            timestamp, state, weekday, duration, *codes = entry
-            shift_codes = [c for c in codes if c.startswith("SC:")]
-            is_break = ('break' in codes)
-            is_shiftcrossover = ('shiftcrossover' in codes)
-
-            # 1) If break or shift crossover, reset current error buffer
-            if is_break or is_shiftcrossover:
-                error_entries_buffer[machine].clear()
-                error_duration_buffer[machine] = 0.0
-                skip_consecutive_errors[machine] = True
-                continue
-
-            # 2) If skipping errors (set true after a break/crossover), ignore ERROR
-            if state == "ERROR" and skip_consecutive_errors[machine]:
-                continue
-
-            # 3) If we see an ERROR, accumulate in the buffer
-            if state == "ERROR":
-                error_entries_buffer[machine].append((timestamp, state, weekday, duration, shift_codes))
-                error_duration_buffer[machine] += duration
-                continue
-
-            # 4) We hit a NON-ERROR; check the buffer
-            if error_duration_buffer[machine] >= 3600:
-                # Discard buffer if total errors >= 1 hour
-                error_entries_buffer[machine].clear()
-                error_duration_buffer[machine] = 0.0
+    progress = pyqtSignal(str, int, int)
+    succeeded = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, schedule_csv, machine_csv, trace_memory=False, profile_calls=False, split=False, compact=False,
+                 parent=None):
+        super().__init__(parent)
+        self.schedule_csv = schedule_csv
+        self.machine_csv = machine_csv
+        self.split = split
+        self.compact = compact
+        self.trace_memory = trace_memory
+        self.profile_calls = profile_calls
+        self.profile = None
+        self.profile_path = None
+
+    def report(self, stage, done, total):
+        from machine_state_core import CalculationCancelled
+        if self.isInterruptionRequested():
+            raise CalculationCancelled()
+        self.progress.emit(stage, done, total)
+
+    def run(self):
+        from machine_state_core import (CalculationCancelled, CompiledSchedule, StageProfile, default_cache_dir,
+                                        parse_machine_files, prepare_machine_entries, process_shift_schedule_combined_dict,
+                                        summarize_machine_data_incremental, summarize_machine_entries_with_exclusion,
+                                        update_machine_data)
+        self.profile = StageProfile(self.trace_memory)
+        if self.profile_calls:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            with self.profile.stage("schedule") as record:
+                schedule_data = process_shift_schedule_combined_dict(self.schedule_csv)
+                record['rows'] += sum(len(periods) for periods in schedule_data.values())
+            if isinstance(self.machine_csv, str):
+                # Only days appended since the last Calculate on this file and schedule are processed
+                results, datetime_range = summarize_machine_data_incremental(self.machine_csv, schedule_data,
+                                                                             progress=self.report, profile=self.profile,
+                                                                             split=self.split, compact=self.compact,
+                                                                             with_ledger=True, with_cube=True)
             else:
-                # If we actually have an error buffer, it's a valid jam event
-                if error_entries_buffer[machine]:
-                    # Gather all shift codes in the buffer
-                    shifts_in_block = set()
-                    for buf_ts, buf_state, buf_wd, buf_dur, buf_codes in error_entries_buffer[machine]:
-                        for sc in buf_codes:
-                            if sc.startswith("SC:"):
-                                shifts_in_block.add(sc)
-
-                    # Increment jam counts for each shift code involved
-                    for sc in shifts_in_block:
-                        jam_count_by_shift[sc][machine] += 1
-
-                    # Also increment the overall machine jam count
-                    overall_jam_count[machine] += 1
-
-                # Flush these ERROR durations to the final result
-                while error_entries_buffer[machine]:
-                    buf_ts, buf_state, buf_wd, buf_dur, buf_codes = error_entries_buffer[machine].pop(0)
-                    # Each error's duration is split across its shift codes
-                    if buf_codes:
-                        split_duration = buf_dur / len(buf_codes)
-                        for sc in buf_codes:
-                            if sc.startswith("SC:"):
-                                result[sc][machine][buf_state] += split_duration
-
-            # 5) Reset
-            error_duration_buffer[machine] = 0.0
-            skip_consecutive_errors[machine] = False
-
-            # 6) Handle non-ERROR states
-            if shift_codes and state != "ERROR":
-                split_duration = duration / len(shift_codes)
-                for sc in shift_codes:
-                    result[sc][machine][state] += split_duration
-
-    return result, jam_count_by_shift, overall_jam_count
-
-
-def parse_time(entry):
+                # Several files (a folder of daily or weekly exports) are read together and merged
+                with self.profile.stage("parse") as record:
+                    machine_data, datetime_range = parse_machine_files(self.machine_csv, progress=self.report)
+                    record['rows'] += len(machine_data)
+                rows = len(machine_data)
+                self.report("Summarizing", 0, rows)
+                schedule = CompiledSchedule(schedule_data)
+                machine_data = prepare_machine_entries(machine_data, schedule, self.split, self.compact,
+                                                       self.profile.stage)
+                with self.profile.stage("annotate", len(machine_data)):
+                    updated_data = update_machine_data(machine_data, schedule)
+                with self.profile.stage("summarize", len(machine_data)):
+                    results = summarize_machine_entries_with_exclusion(updated_data, vectorized=True, with_ledger=True,
+                                                                       with_cube=True)
+                self.report("Summarizing", rows, rows)
+            self.succeeded.emit(results, datetime_range)
+        except CalculationCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+        finally:
+            if self.profile_calls:
+                profiler.disable()
+                profile_dir = os.path.join(os.path.dirname(default_cache_dir()), "profiles")
+                os.makedirs(profile_dir, exist_ok=True)
+                self.profile_path = os.path.join(profile_dir, f"calculate-{QDateTime.currentDateTime().toString('yyyyMMdd-HHmmss')}.prof")
+                profiler.dump_stats(self.profile_path)
+
+class TailWorker(QThread):
     """
-    Parses a time entry in the format 'Day Hour:Minute' into a tuple of (day, time).
-
-    Parameters:
-    - entry (str): The time entry to parse.
-
-    Returns:
-    - tuple: A tuple containing the day and time parsed from the entry.
+    Follows a machine CSV that is still being written, for CSVSummarizerApp's live mode. Polls
+    it every POLL_MS, summarizes only the appended rows (see MachineTail) and emits the results
+    whenever rows were added. Runs until requestInterruption().
     """
-    # Check if the entry is NaN or 'n/a', and return None for both day and time if true
-    if pd.isna(entry) or entry.strip().lower() == "n/a":
-        return (None, None)
-    
-    # Split the entry into day and time components
-    day, t = entry.split()
-    
-    # Split the time component into hour and minute components and convert them to integers
-    hour, minute = map(int, t.split(':'))
-    
-    # Return a tuple containing the day and a time object constructed from the hour and minute
-    return (day, time(hour, minute))
+    POLL_MS = 1000
+    progress = pyqtSignal(str, int, int)
+    updated = pyqtSignal(object, object, int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, schedule_csv, machine_csv, split=False, compact=False, parent=None):
+        super().__init__(parent)
+        self.schedule_csv = schedule_csv
+        self.machine_csv = machine_csv
+        self.split = split
+        self.compact = compact
+
+    def report(self, stage, done, total):
+        from machine_state_core import CalculationCancelled
+        if self.isInterruptionRequested():
+            raise CalculationCancelled()
+        self.progress.emit(stage, done, total)
+
+    def run(self):
+        from machine_state_core import CalculationCancelled, MachineTail, process_shift_schedule_combined_dict
+        try:
+            tail = MachineTail(self.machine_csv, process_shift_schedule_combined_dict(self.schedule_csv),
+                               self.split, self.compact)
+            first = True
+            while not self.isInterruptionRequested():
+                rows = tail.poll(self.report)
+                if rows or first:
+                    results, datetime_range = tail.results(with_ledger=True, with_cube=True)
+                    self.updated.emit(results, datetime_range, rows)
+                    first = False
+                # Sleep in short steps so stopping does not wait for a whole poll interval
+                for _ in range(self.POLL_MS // 100):
+                    if self.isInterruptionRequested():
+                        break
+                    self.msleep(100)
+        except CalculationCancelled:
+            pass
+        except Exception as e:
+            self.failed.emit(str(e))
 
-def process_shift_schedule_combined_dict(file_path):
-    """ Process a CSV file of shift data into a structured dictionary format. """
-    shift_data = pd.read_csv(file_path)
-    
-    schedule_dict = {}
-    
-    for _, row in shift_data.iterrows():
-        shift_code = row['Shift Code']
-        shift_start = row['Shift Start Time']
-        shift_end = row['Shift End Time']
-        
-        # Parse times for the shift start and end
-        start_day, start_time = parse_time(shift_start)
-        end_day, end_time = parse_time(shift_end)
-        
-        # Key for breaks
-        break_key = f"{shift_code} breaks"
-        
-        # Store the shift times as a tuple in the list under the shift code
-        if shift_code not in schedule_dict:
-            schedule_dict[shift_code] = []
-        schedule_dict[shift_code].append((start_day, start_time, end_day, end_time))
-        
-        # Initialize breaks list if not present
-        if break_key not in schedule_dict:
-            schedule_dict[break_key] = []
-        
-        # Processing breaks - assuming break times are in pairs in columns labeled 'Break 1 Start', 'Break 1 End', etc.
-        break_columns = [col for col in shift_data.columns if 'Break' in col or 'Lunch' in col]
-        for i in range(0, len(break_columns), 2):  # Iterate in steps of 2 to get start and end together
-            if i + 1 < len(break_columns):  # Check if there is a pair
-                break_start = row[break_columns[i]]
-                break_end = row[break_columns[i + 1]]
-                
-                if pd.notna(break_start) and pd.notna(break_end):
-                    break_start_day, break_start_time = parse_time(break_start)
-                    break_end_day, break_end_time = parse_time(break_end)
-                    
-                    # Append the break times as a tuple
-                    schedule_dict[break_key].append(
-                        (break_start_day, break_start_time, break_end_day, break_end_time)
-                    )
-    
-    return schedule_dict
+class SummaryNode:
+    """ One row of SummaryTreeModel: what it shows (kind and keys) and its children, once fetched. """
+    __slots__ = ('parent', 'row', 'kind', 'keys', 'children', 'pending')
 
-def parse_machine_data(file_path):
-    # Read data from CSV file into a pandas DataFrame
-    data = pd.read_csv(file_path)
-    
-    # Convert the 'Time' column to datetime format
-    data['Time'] = pd.to_datetime(data['Time'])
-    
-    # Extract the weekday from the 'Time' column and add it as a new column named 'Weekday'
-    data['Weekday'] = data['Time'].dt.day_name()
-    
-    # Determine the first and last datetime for the dataset
-    datetime_range = (data['Time'].min(), data['Time'].max())
-    
-    # Create an empty dictionary to store machine data
-    machine_data = {}
-    
-    # Iterate through each column (machine) in the DataFrame
-    for machine in sorted(data.columns):
-        # Exclude columns named 'Time' and 'Weekday'
-        if machine != 'Time' and machine != 'Weekday':
-            # Select rows with non-null values in columns 'Time', 'Weekday', and the current machine column
-            valid_data = data[['Time', 'Weekday', machine]].dropna()
-            
-            # Create a new column 'Next_Time' which contains the next timestamp for each row
-            valid_data['Next_Time'] = valid_data['Time'].shift(-1)
-            
-            # Calculate the duration between consecutive timestamps in seconds and store it in a new column 'Duration'
-            valid_data['Duration'] = (valid_data['Next_Time'] - valid_data['Time']).dt.total_seconds()
-            
-            # Replace missing durations (NaN) with a default duration of 180 seconds
-            valid_data.loc[valid_data['Duration'].isna(), 'Duration'] = 180
-            
-            # Combine the 'Time', machine readings, weekday, and duration into tuples and store them as entries for the current machine
-            machine_entries = list(zip(valid_data['Time'], valid_data[machine], valid_data['Weekday'], valid_data['Duration']))
-            
-            # Store the machine entries in the machine_data dictionary with the machine name as the key
-            machine_data[machine] = machine_entries
-
-    # Return the dictionary containing parsed machine data
-    return machine_data, datetime_range
-       
-def within_time_period(start_day, start_time, end_day, end_time, current_day, current_time):
-    # Dictionary mapping weekday names to their corresponding indices (0 for Monday, 1 for Tuesday, etc.)
-    weekdays = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6}
-    
-    # Get the index of the start day, end day, and current day from the weekdays dictionary
-    start_index = weekdays[start_day]
-    end_index = weekdays[end_day]
-    current_index = weekdays[current_day]
-    
-    # Adjust the end index if it's before the start index to account for the next week
-    if end_index < start_index:
-        end_index += 7
-        
-    # Adjust the current index if it's before the start index to account for the next week
-    if current_index < start_index:
-        current_index += 7
-        
-    # Check if the current day falls within the specified period
-    is_within_day = start_index <= current_index <= end_index
-    
-    # If the current day is within the specified period
-    if is_within_day:
-        # If the start, current, and end days are the same
-        if start_index == current_index == end_index:
-            # Check if the current time is within the specified time range
-            return start_time <= current_time <= end_time
-        # If the current day is the start day
-        elif start_index == current_index:
-            # Check if the current time is after the start time
-            return current_time >= start_time
-        # If the current day is the end day
-        elif end_index == current_index:
-            # Check if the current time is before the end time
-            return current_time <= end_time
-        # If the current day is between the start and end days
-        else:
-            # Return True since any time during these days is within the specified period
-            return True
-    
-    # If the current day is not within the specified period
-    return False
+    def __init__(self, parent, row, kind, keys=()):
+        self.parent = parent
+        self.row = row
+        self.kind = kind
+        self.keys = keys
+        self.children = []
+        self.pending = None  # keys of the children not created yet; None until first fetched
 
-def update_machine_data(machine_data, schedule_dict):
+class SummaryTreeModel(QAbstractItemModel):
     """
-    Updates machine data with shift and break annotations, prepends 'SC:' to shift codes,
-    and appends 'shiftcrossover' to entries without shifts or breaks.
+    Read-only tree of a summary, in the layout display_results describes.
+
+    Rows are created in batches as the view asks for them (canFetchMore/fetchMore), so
+    only expanded nodes cost anything, and text, fonts and colors are made on demand in data().
     """
-    updated_data = {}  # Initialize an empty dictionary to store updated machine data
-    for machine_id, entries in machine_data.items():
-        updated_entries = []  # Initialize an empty list to store updated entries for the current machine
-        for entry in entries:
-            entry_dt, status, weekday, duration = entry
-            entry_dt = pd.to_datetime(entry_dt)  # Ensure the entry datetime is a pandas datetime object
-            
-            shifts_applied = []  # Initialize an empty list to store applied shifts
-            is_break_applied = False  # Initialize a flag to track if a break is applied
-            
-            # Check each shift and break in the schedule dictionary
-            for shift, times in schedule_dict.items():
-                for time_range in times:
-                    start_day, start_time, end_day, end_time = time_range
-                    # Check if the entry falls within the time range of the shift or break
-                    if within_time_period(start_day, start_time, end_day, end_time, weekday, entry_dt.time()):
-                        if 'breaks' in shift:
-                            # If a break is applied, add it to the list of applied shifts and set the flag
-                            if not is_break_applied:
-                                shifts_applied.append("break")
-                                is_break_applied = True
-                        else:
-                            # If a shift is applied, prepend 'SC:' to the shift code and add it to the list of applied shifts
-                            shifts_applied.append(f"SC:{shift}")
-
-            # Determine the annotation for the entry based on applied shifts and breaks
-            if shifts_applied:
-                # If any shifts or breaks are applied, extend the original tuple with them
-                updated_entry = entry + tuple(shifts_applied)
-            else:
-                # If no shifts or breaks are applied, append 'shiftcrossover' to the original tuple
-                updated_entry = entry + ("shiftcrossover",)
+    FETCH_BATCH = 256
+    COLUMNS = ['Item', 'Detail']
 
-            # Add the updated entry to the list of updated entries for the current machine
-            updated_entries.append(updated_entry)
+    # Colors
+    color_error_text = QColor(193, 131, 85)
+    color_available_text = QColor(79, 163, 85)
+    color_full_text = QColor(97, 170, 230)
 
-        # Add the list of updated entries for the current machine to the updated_data dictionary
-        updated_data[machine_id] = updated_entries
+    def __init__(self, data=None, jam_count_by_shift=None, overall_jam_count=None, parent=None):
+        super().__init__(parent)
+        # Font definitions
+        self.shift_font = QFont("Consolas", 13, QFont.Bold)
+        self.machine_font = QFont("Consolas", 12)
+        self.state_font = QFont("Cascadia Code", 11)
+        self.setSummary(data or {}, jam_count_by_shift or {}, overall_jam_count or {})
+
+    def setSummary(self, data, jam_count_by_shift, overall_jam_count):
+        self.beginResetModel()
+        self.summary = data
+        self.jam_count_by_shift = jam_count_by_shift
+        self.overall_jam_count = overall_jam_count
+        self.grand_total_jams = sum(overall_jam_count.values())
+        self.root = SummaryNode(None, 0, 'root')
+        self.endResetModel()
+
+    def rowCountIfExpanded(self):
+        """ Number of rows the tree has with every node expanded. """
+        machines = sum(len(machines) for machines in self.summary.values())
+        states = sum(len(states) for machines in self.summary.values() for states in machines.values())
+        return 1 + len(self.overall_jam_count) + 1 + len(self.summary) + machines + states
+
+    def childKeys(self, node):
+        if node.kind == 'root':
+            return [('overall',)] + [(shift_code,) for shift_code in sorted(self.summary.keys())]
+        if node.kind == 'overall':
+            return [(machine_id,) for machine_id in sorted(self.overall_jam_count.keys())] + [('total',)]
+        if node.kind == 'shift':
+            return [node.keys + (machine_id,) for machine_id in sorted(self.summary[node.keys[0]].keys())]
+        if node.kind == 'machine':
+            shift_code, machine_id = node.keys
+            return [node.keys + (state,) for state in sorted(self.summary[shift_code][machine_id].keys())]
+        return []
+
+    def childKind(self, node, keys):
+        if node.kind == 'root':
+            return 'overall' if keys == ('overall',) else 'shift'
+        if node.kind == 'overall':
+            return 'total' if keys == ('total',) else 'overall_machine'
+        return {'shift': 'machine', 'machine': 'state'}[node.kind]
+
+    def nodeFromIndex(self, index):
+        return index.internalPointer() if index.isValid() else self.root
+
+    def index(self, row, column, parent=QModelIndex()):
+        node = self.nodeFromIndex(parent)
+        if not 0 <= row < len(node.children) or not 0 <= column < len(self.COLUMNS):
+            return QModelIndex()
+        return self.createIndex(row, column, node.children[row])
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        parent = index.internalPointer().parent
+        if parent is None or parent is self.root:
+            return QModelIndex()
+        return self.createIndex(parent.row, 0, parent)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.column() > 0:
+            return 0
+        return len(self.nodeFromIndex(parent).children)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.COLUMNS)
+
+    def hasChildren(self, parent=QModelIndex()):
+        node = self.nodeFromIndex(parent)
+        if parent.column() > 0 or node.kind in ('overall_machine', 'total', 'state'):
+            return False
+        return bool(node.children) or node.pending is None or bool(node.pending)
+
+    def canFetchMore(self, parent):
+        node = self.nodeFromIndex(parent)
+        return self.hasChildren(parent) and (node.pending is None or bool(node.pending))
+
+    def fetchMore(self, parent):
+        node = self.nodeFromIndex(parent)
+        if node.pending is None:
+            node.pending = self.childKeys(node)[::-1]
+        batch = [node.pending.pop() for _ in range(min(self.FETCH_BATCH, len(node.pending)))]
+        if not batch:
+            return
+        first = len(node.children)
+        self.beginInsertRows(parent, first, first + len(batch) - 1)
+        node.children.extend(SummaryNode(node, first + i, self.childKind(node, keys), keys)
+                             for i, keys in enumerate(batch))
+        self.endInsertRows()
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        node = index.internalPointer()
+        if role == Qt.DisplayRole:
+            return self.text(node) if index.column() == 0 else ""
+        if role == Qt.FontRole:
+            if node.kind in ('overall', 'shift'):
+                return self.shift_font
+            return self.state_font if node.kind == 'state' else self.machine_font
+        if role == Qt.ForegroundRole and node.kind == 'state' and index.column() == 0:
+            # colorize based on state
+            state = node.keys[2]
+            if "ERROR" in state:
+                return self.color_error_text
+            elif "AVAILABLE" in state:
+                return self.color_available_text
+            elif "FULL" in state:
+                return self.color_full_text
+        return None
+
+    def text(self, node):
+        if node.kind == 'overall':
+            return "Overall Machine Jams"
+        if node.kind == 'overall_machine':
+            machine_id = node.keys[0]
+            machine_jams = self.overall_jam_count[machine_id]
+            if self.grand_total_jams > 0:
+                jam_pct = (machine_jams / self.grand_total_jams) * 100.0
+            else:
+                jam_pct = 0.0
+            # e.g. "Machine_01: 5 jam(s) (33.33%)"
+            return f"{machine_id}: {machine_jams} jam(s) ({jam_pct:.2f}%)"
+        if node.kind == 'total':
+            return f"Total Jams: {self.grand_total_jams}"
+        if node.kind == 'shift':
+            return node.keys[0][len("SC:"):]  # e.g. "Shift A"
+        if node.kind == 'machine':
+            shift_code, machine_id = node.keys
+            shift_jams = self.jam_count_by_shift.get(shift_code, {}).get(machine_id, 0)
+            total_error_seconds = self.summary[shift_code][machine_id].get("ERROR", 0.0)
+
+            # Compute average jam time in minutes
+            if shift_jams > 0:
+                avg_jam_time_minutes = (total_error_seconds / shift_jams) / 60.0
+            else:
+                avg_jam_time_minutes = 0.0
 
-    # Return the dictionary containing updated machine data
-    return updated_data
+            # e.g. "Machine_01 (2 jams, avg jam 15.00 mins)"
+            return f"{machine_id} ({shift_jams} jams, avg jam {avg_jam_time_minutes:.2f} mins)"
+        if node.kind == 'state':
+            shift_code, machine_id, state = node.keys
+            # Convert each state duration to hours for display
+            hours = self.summary[shift_code][machine_id][state] / 3600.0
+            return f"{state}: {hours:.2f} hrs"
+        return ""
 
 class CSVSummarizerApp(QMainWindow):
+    # Results with at most this many rows are shown fully expanded
+    EXPAND_ALL_ROWS = 2000
+
     def __init__(self):
         super().__init__()
         self.main_widget = QWidget(self)
         self.setCentralWidget(self.main_widget)
         self.setupUI()
+        # Start loading the pipeline once the event loop is running and the window has painted
+        QTimer.singleShot(0, preload_pipeline)
 
     def setupUI(self):
         self.configureWindow()
@@ -338,6 +365,35 @@ class CSVSummarizerApp(QMainWindow):
         fileMenu = menuBar.addMenu('&File')
         helpMenu = menuBar.addMenu('&Help')
 
+        openFolderAction = QAction('Open Machine &Folder...', self)
+        openFolderAction.triggered.connect(self.load_machine_folder)
+        fileMenu.addAction(openFolderAction)
+
+        exportJamsAction = QAction('Export &Jam Events...', self)
+        exportJamsAction.triggered.connect(self.export_jam_events)
+        fileMenu.addAction(exportJamsAction)
+
+        exportTimingsAction = QAction('Export Stage &Timings...', self)
+        exportTimingsAction.triggered.connect(self.export_stage_timings)
+        fileMenu.addAction(exportTimingsAction)
+
+        # Opt-in peak memory per stage and cProfile capture of each Calculate; both slow it down
+        self.traceMemoryAction = QAction('Trace Stage &Memory (tracemalloc)', self, checkable=True)
+        fileMenu.addAction(self.traceMemoryAction)
+        self.profileAction = QAction('&Profile Calculations (cProfile)', self, checkable=True)
+        fileMenu.addAction(self.profileAction)
+        # Charges rows running past a shift or break boundary to each side by the exact seconds
+        self.splitAction = QAction('&Split Rows at Shift Boundaries', self, checkable=True)
+        fileMenu.addAction(self.splitAction)
+        # Merges repeated-state rows before annotating; same results, fewer rows to summarize
+        self.compactAction = QAction('&Compact Repeated States', self, checkable=True)
+        fileMenu.addAction(self.compactAction)
+        # Follows a machine CSV the PID is still writing, updating the results as rows arrive
+        self.liveAction = QAction('&Live Tail Machine CSV', self, checkable=True)
+        self.liveAction.toggled.connect(self.toggle_live)
+        fileMenu.addAction(self.liveAction)
+        fileMenu.addSeparator()
+
         exitAction = QAction('&Exit', self)
         exitAction.setShortcut('Ctrl+Q')
         exitAction.triggered.connect(self.close)
@@ -407,6 +463,7 @@ class CSVSummarizerApp(QMainWindow):
         self.createInfoText()
         self.createProgressBar()
         self.createDateRangeLabel()
+        self.createFilterBar()
         self.createTreeView()
 
     def setupLayouts(self):
@@ -417,12 +474,14 @@ class CSVSummarizerApp(QMainWindow):
         self.button_layout.addWidget(self.load_schedule_btn)
         self.button_layout.addWidget(self.load_machine_btn)
         self.button_layout.addWidget(self.calculate_btn)
+        self.button_layout.addWidget(self.cancel_btn)
         
         # Add layouts and widgets to the main layout
         self.layout.addLayout(self.button_layout)
         self.layout.addWidget(self.info_text)
         self.layout.addWidget(self.progress_bar)
         self.layout.addWidget(self.date_range_label)
+        self.layout.addWidget(self.filter_bar)
         self.layout.addWidget(self.tree_view)
         
         # Set the main layout to the central widget
@@ -432,10 +491,13 @@ class CSVSummarizerApp(QMainWindow):
         self.load_schedule_btn = self.createButton('Schedules CSV', 'calendar.png', 22)
         self.load_machine_btn = self.createButton('Machine CSV', 'floppy.png', 24)
         self.calculate_btn = self.createButton('Calculate', 'calculator.png', 24)
+        self.cancel_btn = self.createButton('Cancel', 'rewind.png', 24)
+        self.cancel_btn.setVisible(False)  # Only shown while calculating
         
         self.load_schedule_btn.clicked.connect(self.load_schedule_csv)
         self.load_machine_btn.clicked.connect(self.load_machine_csv)
         self.calculate_btn.clicked.connect(self.calculate)
+        self.cancel_btn.clicked.connect(self.cancel_calculation)
 
     def createButton(self, text, icon_file, icon_size):
         button = QPushButton(text)
@@ -457,9 +519,37 @@ class CSVSummarizerApp(QMainWindow):
         self.date_range_label.setStyleSheet("color: #8e8e8e;")
         self.date_range_label.setFont(QFont("Consolas", 9))
 
+    def createFilterBar(self):
+        # Date range and machine filters, re-summed from the SummaryCube of the last Calculate
+        self.filter_bar = QWidget()
+        filter_layout = QHBoxLayout(self.filter_bar)
+        filter_layout.setContentsMargins(0, 0, 0, 0)
+        self.start_date_edit = QDateEdit(calendarPopup=True)
+        self.end_date_edit = QDateEdit(calendarPopup=True)
+        self.machine_filter_btn = QToolButton()
+        self.machine_filter_btn.setText('Machines')
+        self.machine_filter_btn.setPopupMode(QToolButton.InstantPopup)
+        self.machine_filter_menu = QMenu(self.machine_filter_btn)
+        self.machine_filter_btn.setMenu(self.machine_filter_menu)
+
+        for text, widget in (('From', self.start_date_edit), ('To', self.end_date_edit), (None, self.machine_filter_btn)):
+            if text:
+                label = QLabel(text)
+                label.setStyleSheet("color: #8e8e8e;")
+                label.setFont(QFont("Consolas", 9))
+                filter_layout.addWidget(label)
+            widget.setFont(QFont("Consolas", 9))
+            widget.setStyleSheet(self.filterStyle())
+            filter_layout.addWidget(widget)
+        filter_layout.addStretch()
+
+        self.start_date_edit.dateChanged.connect(self.apply_filters)
+        self.end_date_edit.dateChanged.connect(self.apply_filters)
+        self.filter_bar.setVisible(False)  # Shown once there are results to filter
+
     def createTreeView(self):
         self.tree_view = QTreeView()
-        self.model = QStandardItemModel()
+        self.model = SummaryTreeModel()
         self.tree_view.setModel(self.model)
         self.tree_view.setHeaderHidden(True)
         self.tree_view.header().setStretchLastSection(False)
@@ -614,6 +704,20 @@ class CSVSummarizerApp(QMainWindow):
 
         self.menuBar().setStyleSheet(style)
         
+    def filterStyle(self):
+        return """
+            QDateEdit, QToolButton {
+                background-color: #1f1f1f;
+                color: #8e8e8e;
+                border: 1px solid #2a2a2a;
+                border-radius: 5px;
+                padding: 2px 6px;
+            }
+            QToolButton::menu-indicator {
+                image: none;
+            }
+            """
+
     def createProgressBar(self):
         self.progress_bar = QProgressBar()
         self.progress_bar.setMinimum(0)
@@ -647,9 +751,24 @@ class CSVSummarizerApp(QMainWindow):
             self.info_text.append(f"Loaded schedule CSV: {self.schedule_csv}")
 
     def load_machine_csv(self):
-        self.machine_csv, _ = QFileDialog.getOpenFileName(self, "Open Machine CSV", "", "CSV files (*.csv)")
-        if self.machine_csv:
+        # Several files can be picked, e.g. one export per day; they are merged by time
+        machine_csvs, _ = QFileDialog.getOpenFileNames(self, "Open Machine CSV", "", "CSV files (*.csv)")
+        if len(machine_csvs) == 1:
+            self.machine_csv = machine_csvs[0]
             self.info_text.append(f"Loaded machine CSV: {self.machine_csv}")
+        elif machine_csvs:
+            self.machine_csv = sorted(machine_csvs)
+            self.info_text.append(f"Loaded {len(self.machine_csv)} machine CSVs from {os.path.dirname(self.machine_csv[0])}")
+
+    def load_machine_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Open Machine CSV Folder")
+        if folder:
+            machine_csvs = sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.lower().endswith('.csv'))
+            if not machine_csvs:
+                self.info_text.append(f"No CSV files found in {folder}")
+                return
+            self.machine_csv = machine_csvs
+            self.info_text.append(f"Loaded {len(machine_csvs)} machine CSVs from {folder}")
 
     def calculate(self):
         if not hasattr(self, 'schedule_csv') or not self.schedule_csv \
@@ -658,45 +777,199 @@ class CSVSummarizerApp(QMainWindow):
             self.progress_bar.setValue(0)
             return
 
+        self.progress_bar.setValue(0)
         self.progress_bar.setVisible(True)
-        
+        self.calculate_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.cancel_btn.setVisible(True)
+
+        self.worker = CalculationWorker(self.schedule_csv, self.machine_csv, self.traceMemoryAction.isChecked(),
+                                        self.profileAction.isChecked(), self.splitAction.isChecked(),
+                                        self.compactAction.isChecked(), self)
+        self.worker.progress.connect(self.update_progress)
+        self.worker.succeeded.connect(self.calculation_succeeded)
+        self.worker.failed.connect(lambda message: self.info_text.append("Error during calculation: " + message))
+        self.worker.cancelled.connect(lambda: self.info_text.append("Calculation cancelled."))
+        self.worker.finished.connect(self.calculation_finished)
+        self.worker.start()
+
+    def cancel_calculation(self):
+        if getattr(self, 'worker', None) is not None:
+            self.worker.requestInterruption()
+            self.cancel_btn.setEnabled(False)
+
+    def update_progress(self, stage, done, total):
+        # Reading fills the first half of the bar and summarizing the second
+        offset = 50 if stage == "Summarizing" else 0
+        self.progress_bar.setValue(offset + (50 * done // total if total else 50))
+        self.progress_bar.setFormat(f"{stage}: {done:,} / {total:,}")
+
+    def calculation_succeeded(self, results, datetime_range):
+        _, _, overall_jam_count, self.jam_ledger, self.summary_cube = results
+        self.datetime_range = datetime_range
+
+        # Optional: Log overall jam counts to info_text
+        self.info_text.append("Overall Machine Jams (all shifts):")
+        for machine_id, count in overall_jam_count.items():
+            self.info_text.append(f" - {machine_id}: {count} jam(s) total")
+
+        # Now display results in the tree view
+        profile = self.worker.profile
         try:
-            self.progress_bar.setValue(10)
-            QCoreApplication.processEvents()  # Keep UI responsive
-
-            machine_data, datetime_range = parse_machine_data(self.machine_csv)
-            self.progress_bar.setValue(30)
-            QCoreApplication.processEvents()
-
-            schedule_data = process_shift_schedule_combined_dict(self.schedule_csv)
-            self.progress_bar.setValue(50)
-            QCoreApplication.processEvents()
+            with profile.stage("populate tree") as record:
+                self.reset_filters()
+                record['rows'] += self.model.rowCountIfExpanded()
+        except Exception as e:
+            self.info_text.append("Error during calculation: " + str(e))
 
-            updated_machine_data = update_machine_data(machine_data, schedule_data)
-            self.progress_bar.setValue(70)
-            QCoreApplication.processEvents()
+        # Stage timings, kept for File > Export Stage Timings
+        self.stage_timings = {'schedule_csv': self.schedule_csv, 'machine_csv': self.machine_csv,
+                              'stages': profile.as_dict()}
+        self.info_text.append("Stage timings:")
+        for line in profile.lines():
+            self.info_text.append(f" - {line}")
+
+    def calculation_finished(self):
+        if self.worker.profile_path:
+            self.info_text.append(f"cProfile stats written to {self.worker.profile_path}")
+        self.worker.deleteLater()
+        self.worker = None
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setValue(0)
+        self.calculate_btn.setEnabled(True)
+        self.cancel_btn.setVisible(False)
 
-            # We now get 3 results back
-            summarized_data, jam_count_by_shift, overall_jam_count = summarize_machine_entries_with_exclusion(updated_machine_data)
-            self.progress_bar.setValue(90)
-            QCoreApplication.processEvents()
+    def reset_filters(self, keep=False):
+        """
+        Sets the filters to every day and machine in the SummaryCube and shows the results.
+        With keep (a live update), unticked machines and a later start date are kept, and an
+        end date on the last day moves on to the new last day.
+        """
+        dates = self.summary_cube.dates()
+        first, last = (QDate(dates[0]), QDate(dates[-1])) if dates else (QDate.currentDate(), QDate.currentDate())
+        start, end, unticked = first, last, set()
+        if keep and self.filter_bar.isVisibleTo(self):
+            if self.start_date_edit.date() != self.start_date_edit.minimumDate():
+                start = max(self.start_date_edit.date(), first)
+            if self.end_date_edit.date() != self.end_date_edit.maximumDate():
+                end = min(self.end_date_edit.date(), last)
+            unticked = {action.data() for action in self.machine_filter_menu.actions() if not action.isChecked()}
+        for edit in (self.start_date_edit, self.end_date_edit):
+            edit.blockSignals(True)
+            edit.setDateRange(first, last)
+        self.start_date_edit.setDate(start)
+        self.end_date_edit.setDate(end)
+        for edit in (self.start_date_edit, self.end_date_edit):
+            edit.blockSignals(False)
+
+        self.machine_filter_menu.clear()
+        for machine in self.summary_cube.machines:
+            action = self.machine_filter_menu.addAction(str(machine))
+            action.setCheckable(True)
+            action.setChecked(machine not in unticked)
+            action.setData(machine)
+            action.toggled.connect(self.apply_filters)
+        self.filter_bar.setVisible(True)
+        self.apply_filters()
+
+    def apply_filters(self):
+        """ Re-sums the SummaryCube over the chosen days and machines and displays the result. """
+        if getattr(self, 'summary_cube', None) is None:
+            return
+        start, end = self.start_date_edit.date().toPyDate(), self.end_date_edit.date().toPyDate()
+        actions = self.machine_filter_menu.actions()
+        machines = [action.data() for action in actions if action.isChecked()]
+        self.machine_filter_btn.setText('Machines' if len(machines) == len(actions) else f'Machines ({len(machines)}/{len(actions)})')
+
+        data, jam_count_by_shift, overall_jam_count = self.summary_cube.results(start, end, machines)
+        dates = self.summary_cube.dates()
+        datetime_range = self.datetime_range if dates and (start, end) == (dates[0], dates[-1]) else (start, end)
+        self.display_results(data, datetime_range, jam_count_by_shift, overall_jam_count)
+
+    def toggle_live(self, checked):
+        if not checked:
+            if getattr(self, 'tail_worker', None) is not None:
+                self.tail_worker.requestInterruption()
+            return
+        if not getattr(self, 'schedule_csv', None) or not isinstance(getattr(self, 'machine_csv', None), str):
+            self.info_text.append("Load a schedule CSV and a single machine CSV before starting live mode.")
+            self.liveAction.setChecked(False)
+            return
+        if getattr(self, 'worker', None) is not None:
+            self.info_text.append("Wait for the calculation to finish before starting live mode.")
+            self.liveAction.setChecked(False)
+            return
 
-            # Optional: Log overall jam counts to info_text
-            self.info_text.append("Overall Machine Jams (all shifts):")
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+        self.calculate_btn.setEnabled(False)
+        self.live_jam_counts = None
+        self.tail_worker = TailWorker(self.schedule_csv, self.machine_csv, self.splitAction.isChecked(),
+                                      self.compactAction.isChecked(), self)
+        self.tail_worker.progress.connect(self.update_progress)
+        self.tail_worker.updated.connect(self.live_updated)
+        self.tail_worker.failed.connect(lambda message: self.info_text.append("Error in live mode: " + message))
+        self.tail_worker.finished.connect(self.live_finished)
+        self.tail_worker.start()
+        self.info_text.append(f"Watching {self.machine_csv} for new rows...")
+
+    def live_updated(self, results, datetime_range, rows):
+        _, _, overall_jam_count, self.jam_ledger, self.summary_cube = results
+        self.datetime_range = datetime_range
+        self.progress_bar.setVisible(False)
+
+        # Only jams that happened since the last update are worth a line
+        if self.live_jam_counts is not None:
             for machine_id, count in overall_jam_count.items():
-                self.info_text.append(f" - {machine_id}: {count} jam(s) total")
-
-            # Now display results in the tree view
-            self.display_results(summarized_data, datetime_range, jam_count_by_shift, overall_jam_count)
+                if count > self.live_jam_counts.get(machine_id, 0):
+                    self.info_text.append(f"{datetime_range[1]} - {machine_id}: {count} jam(s) total")
+        self.live_jam_counts = dict(overall_jam_count)
+
+        scroll = self.tree_view.verticalScrollBar().value()
+        self.reset_filters(keep=True)
+        self.tree_view.verticalScrollBar().setValue(scroll)
+
+    def live_finished(self):
+        self.tail_worker.deleteLater()
+        self.tail_worker = None
+        self.liveAction.setChecked(False)
+        self.progress_bar.setVisible(False)
+        self.progress_bar.setValue(0)
+        self.calculate_btn.setEnabled(True)
+        self.info_text.append("Live mode stopped.")
 
-            self.progress_bar.setValue(100)
-            QCoreApplication.processEvents()
+    def export_jam_events(self):
+        if getattr(self, 'jam_ledger', None) is None:
+            self.info_text.append("Run Calculate before exporting jam events.")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Jam Events", "jam_events.csv",
+                                                   "CSV files (*.csv);;Jam ledger (*.npz)")
+        if file_path:
+            if file_path.lower().endswith('.npz'):
+                self.jam_ledger.save(file_path, {'machine_csv': self.machine_csv, 'schedule_csv': self.schedule_csv})
+            else:
+                self.jam_ledger.to_frame().to_csv(file_path, index=False)
+            self.info_text.append(f"{len(self.jam_ledger):,} jam events written to {file_path}")
 
-        except Exception as e:
-            self.info_text.append("Error during calculation: " + str(e))
-            self.progress_bar.setValue(0)
-        finally:
-            self.progress_bar.setVisible(False)
+    def export_stage_timings(self):
+        if not getattr(self, 'stage_timings', None):
+            self.info_text.append("Run Calculate before exporting stage timings.")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export Stage Timings", "stage_timings.json", "JSON files (*.json)")
+        if file_path:
+            with open(file_path, 'w') as file:
+                json.dump(self.stage_timings, file, indent=2)
+            self.info_text.append(f"Stage timings written to {file_path}")
+
+    def closeEvent(self, event):
+        # Let a running calculation stop before the window (its parent) goes away
+        if getattr(self, 'worker', None) is not None:
+            self.worker.requestInterruption()
+            self.worker.wait()
+        if getattr(self, 'tail_worker', None) is not None:
+            self.tail_worker.requestInterruption()
+            self.tail_worker.wait()
+        super().closeEvent(event)
 
     def display_results(self, data, datetime_range, jam_count_by_shift, overall_jam_count):
         """
@@ -711,130 +984,15 @@ class CSVSummarizerApp(QMainWindow):
         """
         start_date, end_date = datetime_range
         self.date_range_label.setText(f'DateTime Range: {start_date} | {end_date}')
-        self.model.clear()
-
-        # We'll use two columns: "Item" and "Detail"
-        self.model.setHorizontalHeaderLabels(['Item', 'Detail'])
-
-        # Font definitions
-        shift_font = QFont("Consolas", 13, QFont.Bold)
-        machine_font = QFont("Consolas", 12)
-        state_font = QFont("Cascadia Code", 11)
-
-        # Colors
-        color_error_text = QColor(193, 131, 85)
-        color_available_text = QColor(79, 163, 85)
-        color_full_text = QColor(97, 170, 230)
-
-        #
-        # SECTION 1: Overall Machine Jams
-        #
-        overall_root_item = QStandardItem("Overall Machine Jams")
-        overall_root_item.setFont(shift_font)
-        overall_root_item.setFlags(overall_root_item.flags() & ~Qt.ItemIsEditable)
-
-        overall_root_detail = QStandardItem("")
-        overall_root_detail.setFlags(overall_root_detail.flags() & ~Qt.ItemIsEditable)
-
-        # 1) Calculate the grand total of all jams (across all machines)
-        grand_total_jams = sum(overall_jam_count.values())
-
-        # 2) For each machine, show total jam count and % of total
-        for machine_id in sorted(overall_jam_count.keys()):
-            machine_jams = overall_jam_count[machine_id]
-            if grand_total_jams > 0:
-                jam_pct = (machine_jams / grand_total_jams) * 100.0
-            else:
-                jam_pct = 0.0
 
-            # e.g. "Machine_01: 5 jam(s) (33.33%)"
-            machine_item_text = f"{machine_id}: {machine_jams} jam(s) ({jam_pct:.2f}%)"
-            machine_item = QStandardItem(machine_item_text)
-            machine_item.setFont(machine_font)
-            machine_item.setFlags(machine_item.flags() & ~Qt.ItemIsEditable)
-
-            detail_item = QStandardItem("")
-            detail_item.setFlags(detail_item.flags() & ~Qt.ItemIsEditable)
-
-            overall_root_item.appendRow([machine_item, detail_item])
-
-        # 3) Add a final line at the bottom for total jams across all lines
-        total_line_text = f"Total Jams: {grand_total_jams}"
-        total_line_item = QStandardItem(total_line_text)
-        total_line_item.setFont(machine_font)
-        total_line_item.setFlags(total_line_item.flags() & ~Qt.ItemIsEditable)
-
-        total_line_detail = QStandardItem("")
-        total_line_detail.setFlags(total_line_detail.flags() & ~Qt.ItemIsEditable)
-
-        # Append that row so it appears last in the overall section
-        overall_root_item.appendRow([total_line_item, total_line_detail])
-
-        # Attach the overall root item to the model
-        self.model.appendRow([overall_root_item, overall_root_detail])
-
-        #
-        # SECTION 2: Break down by SHIFT CODE
-        #
-        for shift_code in sorted(data.keys()):
-            shift_display_text = shift_code[len("SC:"):]  # e.g. "Shift A"
-            shift_item = QStandardItem(shift_display_text)
-            shift_item.setFont(shift_font)
-            shift_item.setFlags(shift_item.flags() & ~Qt.ItemIsEditable)
-
-            shift_detail_item = QStandardItem("")
-            shift_detail_item.setFlags(shift_detail_item.flags() & ~Qt.ItemIsEditable)
-
-            # For each machine in this shift
-            for machine_id in sorted(data[shift_code].keys()):
-                shift_jams = jam_count_by_shift[shift_code].get(machine_id, 0)
-                total_error_seconds = data[shift_code][machine_id].get("ERROR", 0.0)
-
-                # Compute average jam time in minutes
-                if shift_jams > 0:
-                    avg_jam_time_minutes = (total_error_seconds / shift_jams) / 60.0
-                else:
-                    avg_jam_time_minutes = 0.0
-
-                # e.g. "Machine_01 (2 jams, avg jam 15.00 mins)"
-                machine_item_text = (
-                    f"{machine_id} ({shift_jams} jams, avg jam {avg_jam_time_minutes:.2f} mins)"
-                )
-                machine_item = QStandardItem(machine_item_text)
-                machine_item.setFont(machine_font)
-                machine_item.setFlags(machine_item.flags() & ~Qt.ItemIsEditable)
-
-                machine_detail_item = QStandardItem("")
-                machine_detail_item.setFlags(machine_detail_item.flags() & ~Qt.ItemIsEditable)
-
-                # For each state/duration in this shift->machine
-                for state, duration_in_seconds in sorted(data[shift_code][machine_id].items()):
-                    # Convert each state duration to hours for display
-                    hours = duration_in_seconds / 3600.0
-                    duration_text = f"{hours:.2f} hrs"
-
-                    state_item = QStandardItem(f"{state}: {duration_text}")
-                    state_item.setFont(state_font)
-                    state_item.setFlags(state_item.flags() & ~Qt.ItemIsEditable)
-
-                    # colorize based on state
-                    if "ERROR" in state:
-                        state_item.setForeground(color_error_text)
-                    elif "AVAILABLE" in state:
-                        state_item.setForeground(color_available_text)
-                    elif "FULL" in state:
-                        state_item.setForeground(color_full_text)
-
-                    state_detail_item = QStandardItem("")
-                    state_detail_item.setFlags(state_detail_item.flags() & ~Qt.ItemIsEditable)
-                    machine_item.appendRow([state_item, state_detail_item])
-
-                shift_item.appendRow([machine_item, machine_detail_item])
-
-            self.model.appendRow([shift_item, shift_detail_item])
-
-        self.tree_view.expandAll()
+        # Rows are only created as the view needs them, see SummaryTreeModel
+        self.model.setSummary(data, jam_count_by_shift, overall_jam_count)
 
+        # Expanding everything creates every row, so big results only open the top level
+        if self.model.rowCountIfExpanded() <= self.EXPAND_ALL_ROWS:
+            self.tree_view.expandAll()
+        else:
+            self.tree_view.expandToDepth(0)
 
     def resize_tree_view_columns(self, index):
         self.tree_view.header().setSectionResizeMode(QHeaderView.ResizeToContents)
@@ -861,6 +1019,7 @@ class MarkdownViewer(QMainWindow):
         try:
             with open(file_path, 'r') as file:
                 markdown_content = file.read()
+            from markdown import markdown
             html_content = markdown(markdown_content)
             self.textBrowser.setHtml(html_content)
         except Exception as e:
@@ -907,6 +1066,9 @@ class MarkdownViewer(QMainWindow):
         """
 
 if __name__ == '__main__':
+    # Needed by the process pool in frozen (PyInstaller) builds
+    import multiprocessing
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     ex = CSVSummarizerApp()
     ex.show()
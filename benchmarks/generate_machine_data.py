@@ -0,0 +1,118 @@
+"""
+Deterministic generator of synthetic machine CSVs in the export format the calculator reads:
+a Time column followed by one state column per machine line.
+
+Each line alternates between runs of AVAILABLE, FULL and IDLE. Jams are laid over the top as
+ERROR runs, starting at a given rate with lognormal lengths, and maintenance closures as ERROR
+runs lasting hours to days. Sample times get a few seconds of jitter and some cells are left
+empty, as in real exports. The same parameters and seed always give the same file.
+
+Usage:
+    python benchmarks/generate_machine_data.py machine_data.csv --lines 4 --years 1
+"""
+import argparse
+import numpy as np
+import pandas as pd
+
+RUN_STATES = np.array(['AVAILABLE', 'FULL', 'IDLE', 'ERROR'], dtype=object)
+RUN_STATE_WEIGHTS = [0.6, 0.25, 0.15]
+ERROR = 3
+
+def overlay_runs(n, starts, lengths):
+    """ Returns a bool array of n samples, True inside any of the runs [start, start + length). """
+    edges = np.zeros(n + 1, dtype=np.int64)
+    np.add.at(edges, np.clip(starts, 0, n), 1)
+    np.add.at(edges, np.clip(starts + lengths, 0, n), -1)
+    return np.cumsum(edges[:-1]) > 0
+
+def generate_line_states(rng, n, interval, jam_rate, jam_median, jam_sigma, closures_per_year,
+                         closure_hours, mean_run_minutes, missing_rate):
+    """ Returns the state codes (index into RUN_STATES, -1 for an empty cell) of one line. """
+    # Runs of normal operation with geometric lengths
+    mean_run = max(mean_run_minutes * 60 / interval, 1.0)
+    run_lengths = rng.geometric(1 / mean_run, size=int(n / mean_run * 1.5) + 16)
+    while run_lengths.sum() < n:
+        run_lengths = np.concatenate((run_lengths, rng.geometric(1 / mean_run, size=len(run_lengths))))
+    run_states = rng.choice(len(RUN_STATE_WEIGHTS), size=len(run_lengths), p=RUN_STATE_WEIGHTS)
+    states = np.repeat(run_states, run_lengths)[:n].astype(np.int8)
+
+    # Jams: Poisson starts at jam_rate per hour, lognormal lengths with median jam_median seconds
+    hours = n * interval / 3600
+    jam_starts = np.sort(rng.integers(0, n, size=rng.poisson(jam_rate * hours)))
+    jam_lengths = np.ceil(rng.lognormal(np.log(jam_median), jam_sigma, size=len(jam_starts)) / interval)
+    states[overlay_runs(n, jam_starts, jam_lengths.astype(np.int64))] = ERROR
+
+    # Maintenance closures: ERROR for closure_hours[0] to closure_hours[1] hours
+    years = n * interval / (365 * 86400)
+    closure_starts = rng.integers(0, n, size=rng.poisson(closures_per_year * years))
+    closure_lengths = rng.uniform(*closure_hours, size=len(closure_starts)) * 3600 / interval
+    states[overlay_runs(n, closure_starts, closure_lengths.astype(np.int64))] = ERROR
+
+    states[rng.random(n) < missing_rate] = -1
+    return states
+
+def generate_machine_data(lines=4, years=1.0, interval=180, jam_rate=0.5, jam_median=240.0, jam_sigma=0.8,
+                          closures_per_year=6, closure_hours=(12, 72), mean_run_minutes=20, jitter=60,
+                          missing_rate=0.02, start="2023-01-02 00:00:00", seed=0):
+    """
+    Generates synthetic machine data.
+
+    Parameters:
+    - lines (int): number of machine lines (PID01, PID02, ...).
+    - years (float): length of the data in years of 365 days.
+    - interval (int): seconds between samples.
+    - jam_rate (float): jams per hour per line.
+    - jam_median (float), jam_sigma (float): median (seconds) and log-space sigma of jam lengths.
+    - closures_per_year (float): maintenance closures per line per year.
+    - closure_hours (tuple): shortest and longest closure in hours.
+    - mean_run_minutes (float): mean length of AVAILABLE/FULL/IDLE runs.
+    - jitter (int): samples are delayed by up to this many seconds.
+    - missing_rate (float): share of cells left empty.
+    - seed (int): random seed; each line gets its own stream, so adding lines keeps the others.
+
+    Returns:
+    - DataFrame: Time as 'YYYY-MM-DD HH:MM:SS' strings, then one column per line.
+    """
+    n = int(years * 365 * 86400 / interval)
+    seeds = np.random.SeedSequence(seed).spawn(lines + 1)
+    offsets = np.arange(n, dtype=np.int64) * interval + np.random.default_rng(seeds[0]).integers(0, jitter + 1, n)
+    times = pd.Timestamp(start) + pd.to_timedelta(offsets, unit='s')
+    data = pd.DataFrame({'Time': times.strftime('%Y-%m-%d %H:%M:%S')})
+
+    for line in range(lines):
+        codes = generate_line_states(np.random.default_rng(seeds[line + 1]), n, interval, jam_rate, jam_median,
+                                     jam_sigma, closures_per_year, closure_hours, mean_run_minutes, missing_rate)
+        column = RUN_STATES[np.maximum(codes, 0)]
+        column[codes < 0] = None
+        data[f'PID{line + 1:02d}'] = column
+    return data
+
+def generate_machine_csv(file_path, **parameters):
+    """ Writes generate_machine_data(**parameters) to file_path and returns the number of rows. """
+    data = generate_machine_data(**parameters)
+    data.to_csv(file_path, index=False)
+    return len(data)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic machine CSV.")
+    parser.add_argument('output', help="CSV file to write")
+    parser.add_argument('--lines', type=int, default=4, help="number of machine lines (default: 4)")
+    parser.add_argument('--years', type=float, default=1.0, help="years of data (default: 1)")
+    parser.add_argument('--interval', type=int, default=180, help="seconds between samples (default: 180)")
+    parser.add_argument('--jam-rate', type=float, default=0.5, help="jams per hour per line (default: 0.5)")
+    parser.add_argument('--jam-median', type=float, default=240.0, help="median jam length in seconds (default: 240)")
+    parser.add_argument('--jam-sigma', type=float, default=0.8, help="log-space sigma of jam lengths (default: 0.8)")
+    parser.add_argument('--closures-per-year', type=float, default=6, help="maintenance closures per line per year (default: 6)")
+    parser.add_argument('--closure-hours', type=float, nargs=2, default=(12, 72), metavar=('MIN', 'MAX'),
+                        help="closure length range in hours (default: 12 72)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args(argv)
+
+    rows = generate_machine_csv(args.output, lines=args.lines, years=args.years, interval=args.interval,
+                                jam_rate=args.jam_rate, jam_median=args.jam_median, jam_sigma=args.jam_sigma,
+                                closures_per_year=args.closures_per_year, closure_hours=tuple(args.closure_hours),
+                                seed=args.seed)
+    print(f"Wrote {rows} rows x {args.lines} lines to {args.output}")
+
+if __name__ == '__main__':
+    main()
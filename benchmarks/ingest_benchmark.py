@@ -0,0 +1,99 @@
+"""
+Benchmark of machine CSV ingestion: reading the file and parsing its Time column.
+
+Variants, on the generated datasets of pipeline_benchmark.py:
+- inferred: read every column with defaults, then pd.to_datetime without a format (the old path)
+- format: usecols and categorical states, Time parsed with the format detect_time_format finds
+- pyarrow: the same through the pyarrow engine, which parses Time while reading (if installed)
+- events: memory-mapping the binary event store that parse_machine_data_cached keeps, written
+  once per dataset beforehand; "read" is the mapping, "parse" the first pass over its columns.
+  This skips melting the CSV into entries too, so it does more than the others.
+
+Each variant is run --repeat times and the fastest run is reported, split into reading and
+Time parsing, along with the speed-up over "inferred".
+
+Usage:
+    python benchmarks/ingest_benchmark.py [--sizes 1w 1y 5y] [--repeat 3]
+"""
+import os
+import sys
+import time
+import argparse
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+sys.path.insert(0, BENCHMARK_DIR)
+
+import pandas as pd
+from pipeline_benchmark import SIZES, dataset_path
+from machine_state_core import MachineEntries, default_csv_engine, parse_machine_data, parse_time_column
+
+def read_inferred(file_path):
+    data = pd.read_csv(file_path)
+    parsed = time.perf_counter()
+    data['Time'] = pd.to_datetime(data['Time'])
+    return parsed
+
+def read_with_engine(engine):
+    def read(file_path):
+        machines = [column for column in pd.read_csv(file_path, nrows=0).columns if column not in ('Time', 'Weekday')]
+        data = pd.read_csv(file_path, engine=engine, usecols=['Time'] + machines,
+                           dtype={machine: 'category' for machine in machines})
+        parsed = time.perf_counter()
+        data['Time'], _ = parse_time_column(data['Time'])
+        return parsed
+    return read
+
+def events_path(file_path):
+    """ Returns the event store of a dataset, writing it the first time. """
+    store_path = f"{os.path.splitext(file_path)[0]}.events"
+    if not os.path.exists(store_path) or os.path.getmtime(store_path) < os.path.getmtime(file_path):
+        parse_machine_data(file_path)[0].write_events(store_path)
+    return store_path
+
+def read_events(file_path):
+    entries, _ = MachineEntries.map_events(events_path(file_path))
+    parsed = time.perf_counter()
+    # Page the records in, as the first stage to use them would
+    entries.timestamps.max(), entries.durations.sum(), entries.state_codes.max()
+    return parsed
+
+def measure(read, file_path, repeat):
+    """ Returns the (read seconds, parse seconds) of the fastest of repeat runs. """
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        parsed = read(file_path)
+        finished = time.perf_counter()
+        if best is None or finished - started < sum(best):
+            best = (parsed - started, finished - parsed)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare ways of reading machine CSVs and parsing their timestamps.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES), help="datasets to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per variant (default: 3)")
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'),
+                        help="where generated datasets are kept (default: benchmarks/data)")
+    args = parser.parse_args(argv)
+
+    variants = {'inferred': read_inferred, 'format': read_with_engine('c')}
+    if default_csv_engine() == 'pyarrow':
+        variants['pyarrow'] = read_with_engine('pyarrow')
+    else:
+        print("pyarrow is not installed; skipping the pyarrow variant")
+    variants['events'] = read_events
+
+    print(f"{'size':<5}{'variant':<10}{'read s':>9}{'parse s':>9}{'total s':>9}{'speed-up':>10}")
+    for size in args.sizes:
+        file_path = dataset_path(args.data_dir, size)
+        events_path(file_path)
+        baseline = None
+        for name, read in variants.items():
+            read_seconds, parse_seconds = measure(read, file_path, args.repeat)
+            total = read_seconds + parse_seconds
+            baseline = baseline or total
+            print(f"{size:<5}{name:<10}{read_seconds:>9.3f}{parse_seconds:>9.3f}{total:>9.3f}{baseline / total:>9.2f}x")
+
+if __name__ == '__main__':
+    main()
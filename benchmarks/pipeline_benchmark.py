@@ -0,0 +1,166 @@
+"""
+Benchmark suite for the calculation pipeline: times and memory-profiles each stage on
+generated machine data of 1 week, 1 year and 5 years.
+
+Stages, in pipeline order:
+- schedule: process_shift_schedule_combined_dict on test_data/test_schedules.csv
+- parse: parse_machine_data
+- split: split_machine_entries, only with --split
+- compact: compact_machine_entries, only with --compact
+  (later stages run on the output of these)
+- annotate: update_machine_data
+- summarize: summarize_machine_entries_with_exclusion (vectorized)
+- parallel: summarize_machine_data_parallel, annotate and summarize together on --workers
+  processes, only with --workers (compare it with annotate + summarize)
+
+Each stage is timed --repeat times (wall and CPU seconds; min and median are reported),
+then run once more under tracemalloc for its peak memory. The datasets are generated with
+fixed seeds by generate_machine_data.py and kept in --data-dir, so runs on different days
+or branches measure the same input. Results are written as JSON; pass an earlier report
+with --compare to print the change per stage.
+
+Usage:
+    python benchmarks/pipeline_benchmark.py [--sizes 1w 1y 5y] [--workers N] [--output report.json] [--compare old.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import numpy as np
+import pandas as pd
+from generate_machine_data import generate_machine_csv
+from machine_state_core import (compact_machine_entries, split_machine_entries, parse_machine_data, process_shift_schedule_combined_dict,
+                                summarize_machine_data_parallel, update_machine_data, summarize_machine_entries_with_exclusion)
+
+SCHEDULE_CSV = os.path.join(REPO_DIR, 'test_data', 'test_schedules.csv')
+
+# Dataset name -> generator parameters
+SIZES = {
+    '1w': {'lines': 4, 'years': 7 / 365, 'seed': 1},
+    '1y': {'lines': 4, 'years': 1, 'seed': 1},
+    '5y': {'lines': 4, 'years': 5, 'seed': 1},
+}
+
+def dataset_path(data_dir, size):
+    """ Returns the CSV of a dataset, generating it the first time. """
+    parameters = SIZES[size]
+    name = f"machines_{size}_{parameters['lines']}lines_seed{parameters['seed']}.csv"
+    file_path = os.path.join(data_dir, name)
+    if not os.path.exists(file_path):
+        os.makedirs(data_dir, exist_ok=True)
+        print(f"Generating {name} ...", flush=True)
+        generate_machine_csv(f"{file_path}.tmp", **parameters)
+        os.replace(f"{file_path}.tmp", file_path)
+    return file_path
+
+def measure(stage, repeat):
+    """ Times stage() repeat times, then measures its peak memory once. Returns (stats, last result). """
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        result = stage()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+        del result
+
+    tracemalloc.start()
+    result = stage()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = {
+        'wall_min': min(walls), 'wall_median': statistics.median(walls),
+        'cpu_min': min(cpus), 'cpu_median': statistics.median(cpus),
+        'peak_mb': peak / 2**20,
+    }
+    return stats, result
+
+def run_size(file_path, repeat, split=False, compact=False, workers=None):
+    """ Runs every stage on one dataset, each on the output of the stage before. """
+    stages = {}
+    stages['schedule'], schedule_data = measure(lambda: process_shift_schedule_combined_dict(SCHEDULE_CSV), repeat)
+    stages['parse'], (machine_data, _) = measure(lambda: parse_machine_data(file_path), repeat)
+    entries = machine_data
+    if split:
+        stages['split'], entries = measure(lambda: split_machine_entries(machine_data, schedule_data), repeat)
+    if compact:
+        split_data = entries
+        stages['compact'], entries = measure(lambda: compact_machine_entries(split_data, schedule_data), repeat)
+    stages['annotate'], updated_data = measure(lambda: update_machine_data(entries, schedule_data), repeat)
+    stages['summarize'], _ = measure(lambda: summarize_machine_entries_with_exclusion(updated_data, vectorized=True), repeat)
+    if workers is not None:
+        stages['parallel'], _ = measure(lambda: summarize_machine_data_parallel(entries, schedule_data, workers), repeat)
+
+    # Rows are counted in the parsed entries throughout, so rows/s stays comparable with and without --compact
+    rows = len(machine_data)
+    for name, stats in stages.items():
+        stats['rows'] = rows if name != 'schedule' else len(schedule_data)
+        stats['rows_per_second'] = stats['rows'] / stats['wall_min'] if stats['wall_min'] else None
+    return {'file': os.path.basename(file_path), 'bytes': os.path.getsize(file_path), 'entries': rows,
+            'annotated_entries': len(entries), 'stages': stages}
+
+def environment():
+    return {
+        'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+        'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def print_report(report, previous=None):
+    header = f"{'size':<5}{'stage':<11}{'wall min':>10}{'cpu min':>10}{'peak MB':>10}{'rows/s':>13}"
+    if previous:
+        header += f"{'wall vs prev':>14}{'peak vs prev':>14}"
+    print(header)
+    for size, result in report['sizes'].items():
+        for stage, stats in result['stages'].items():
+            line = (f"{size:<5}{stage:<11}{stats['wall_min']:>10.3f}{stats['cpu_min']:>10.3f}"
+                    f"{stats['peak_mb']:>10.1f}{stats['rows_per_second'] or 0:>13,.0f}")
+            old = (previous or {}).get('sizes', {}).get(size, {}).get('stages', {}).get(stage)
+            if old:
+                line += f"{stats['wall_min'] / old['wall_min']:>13.2f}x{stats['peak_mb'] / old['peak_mb']:>13.2f}x"
+            print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile each pipeline stage.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES),
+                        help="datasets to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per stage (default: 3)")
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'),
+                        help="where generated datasets are kept (default: benchmarks/data)")
+    parser.add_argument('--split', action='store_true', help="add the split stage after parse")
+    parser.add_argument('--compact', action='store_true', help="add the compact stage after parse (and split)")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="add the parallel stage on N worker processes (0: one per CPU)")
+    parser.add_argument('--output', help="write the report to this JSON file")
+    parser.add_argument('--compare', help="earlier JSON report to compare against")
+    args = parser.parse_args(argv)
+
+    report = {'environment': environment(), 'repeat': args.repeat, 'split': args.split, 'compact': args.compact,
+              'workers': args.workers, 'sizes': {}}
+    for size in args.sizes:
+        report['sizes'][size] = run_size(dataset_path(args.data_dir, size), args.repeat, args.split, args.compact,
+                                         args.workers)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as file:
+            previous = json.load(file)
+    print_report(report, previous)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nReport written to {args.output}")
+
+if __name__ == '__main__':
+    main()
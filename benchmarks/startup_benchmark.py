@@ -0,0 +1,108 @@
+"""
+Startup benchmark for Machine_State_Calculator-1.1.py: time from launching Python to the
+first paint of the main window.
+
+Each run starts a fresh interpreter with -X importtime, which creates the window the same
+way the script does and exits at its first paint (the benchmark's own imports are kept to
+json and argparse). Reported per run:
+- first paint: wall-clock seconds from launch to the first paint event
+- imports: seconds spent importing before the first paint, from the -X importtime log
+- the heaviest top-level imports, and which optional heavy modules were already loaded
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--top 8]
+
+Runs with QT_QPA_PLATFORM=offscreen unless it is already set, so it also works headless.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUI_SCRIPT = os.path.join(REPO_DIR, 'Machine_State_Calculator-1.1.py')
+HEAVY_MODULES = ['numpy', 'pandas', 'markdown', 'machine_state_core']
+
+def child():
+    """ Runs in the benchmarked interpreter: shows the window and reports its first paint. """
+    import importlib.util
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtCore import QObject, QEvent
+
+    sys.path.insert(0, REPO_DIR)
+    spec = importlib.util.spec_from_file_location('jammer_time_gui', GUI_SCRIPT)
+    gui = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(gui)
+
+    class FirstPaint(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint and not hasattr(self, 'painted'):
+                self.painted = time.time()
+                loaded = [module for module in HEAVY_MODULES if module in sys.modules]
+                print(json.dumps({'painted': self.painted, 'loaded': loaded}), flush=True)
+                app.quit()
+            return False
+
+    app = QApplication(sys.argv[:1])
+    first_paint = FirstPaint()
+    app.installEventFilter(first_paint)
+    window = gui.CSVSummarizerApp()
+    window.show()
+    app.exec_()
+
+def parse_importtime(log, top):
+    """ Returns (total import seconds, [(seconds, module)] of the heaviest top-level imports). """
+    top_level = []
+    for line in log.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level imports are the ones not indented under another
+        if not name[1:].startswith(' '):
+            top_level.append((int(cumulative) / 1e6, name.strip()))
+    return sum(seconds for seconds, _ in top_level), sorted(top_level, reverse=True)[:top]
+
+def run_once(top):
+    import subprocess
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    started = time.time()
+    process = subprocess.run([sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--child'],
+                             capture_output=True, text=True, env=env, cwd=REPO_DIR)
+    reports = [line for line in process.stdout.splitlines() if line.startswith('{')]
+    if process.returncode or not reports:
+        raise RuntimeError(f"Benchmark run failed:\n{process.stderr[-2000:]}")
+    report = json.loads(reports[0])
+    imports, heaviest = parse_importtime(process.stderr, top)
+    return report['painted'] - started, imports, heaviest, report['loaded']
+
+def main(argv=None):
+    import statistics
+    parser = argparse.ArgumentParser(description="Measure time to first paint of the JammerTime window.")
+    parser.add_argument('--runs', type=int, default=5, help="number of fresh interpreters to start (default: 5)")
+    parser.add_argument('--top', type=int, default=8, help="number of heaviest imports to list (default: 8)")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        child()
+        return
+
+    # One untimed run warms the OS file cache
+    run_once(args.top)
+    paints, imports = [], []
+    for run in range(args.runs):
+        paint, import_seconds, heaviest, loaded = run_once(args.top)
+        paints.append(paint)
+        imports.append(import_seconds)
+        print(f"run {run + 1}: first paint {paint:.3f} s, imports {import_seconds:.3f} s")
+
+    print(f"\nfirst paint: median {statistics.median(paints):.3f} s, min {min(paints):.3f} s")
+    print(f"imports:     median {statistics.median(imports):.3f} s")
+    print(f"loaded before first paint: {', '.join(loaded) or 'none of ' + ', '.join(HEAVY_MODULES)}")
+    print("heaviest top-level imports (last run):")
+    for seconds, name in heaviest:
+        print(f"  {seconds:7.3f} s  {name}")
+
+if __name__ == '__main__':
+    main()
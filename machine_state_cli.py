@@ -0,0 +1,200 @@
+"""
+Headless entry point for the jam summary, for scheduled runs without the Qt GUI.
+
+Usage:
+    python machine_state_cli.py --schedule SCHEDULE.csv MACHINE.csv [MACHINE.csv ...]
+    python machine_state_cli.py --pair MACHINE.csv SCHEDULE.csv --pair MACHINE2.csv SCHEDULE2.csv
+
+For each machine CSV, <name>.summary.json and/or <name>.summary.csv are written to the output
+directory, along with <name>.jams.npz, the JamLedger of every jam found (and <name>.jams.csv
+with the CSV format). --sweep-thresholds and --sweep-defaults add <name>.thresholds.csv and
+<name>.defaults.csv, the jams each candidate jam threshold or last-entry default duration would
+give (see JamThresholdSweep). A MACHINE_CSV may also be a folder or a quoted glob ("exports/2024-*.csv"); its
+files are merged by time into one summary named after the folder or pattern. Durations are in
+seconds. Never imports Qt.
+"""
+import os
+import sys
+import csv
+import json
+import argparse
+from machine_state_core import (JAM_THRESHOLD_SECONDS, CompiledSchedule, JamThresholdSweep, count_subsecond_entries,
+                                default_cache_dir, expand_machine_files, parse_machine_data, parse_machine_data_cached,
+                                parse_machine_files, prepare_machine_entries, process_shift_schedule_combined_dict,
+                                summarize_machine_data_parallel, summarize_machine_data_streaming,
+                                summarize_machine_data_time_sharded, update_machine_data,
+                                summarize_machine_entries_with_exclusion)
+
+def summarize_pair(machine_csv, schedule_csv, cache_dir=None, split=False, compact=False, with_ledger=False,
+                   with_sweep=False, workers=None, shard_period=None):
+    """
+    Runs parse_machine_data -> process_shift_schedule_combined_dict -> update_machine_data ->
+    summarize_machine_entries_with_exclusion on one machine/schedule file pair. A single machine
+    CSV is streamed through summarize_machine_data_streaming, so memory does not grow with the
+    file, unless one of the options below needs all of its entries at once. A folder or glob
+    as machine_csv is read with parse_machine_files. With a cache_dir, a single machine CSV is
+    parsed once into a memory-mapped event store there and mapped on later runs. split and
+    compact are passed to prepare_machine_entries before annotating; with compact, the summary
+    also gets 'subsecond_entries', the entries whose timestamps make compacting inexact. With
+    workers, each machine line is annotated and summarized on its own worker process by
+    summarize_machine_data_parallel (0: one per CPU). With shard_period ('W' or 'M'), each line is
+    also cut into week or month shards for the workers by summarize_machine_data_time_sharded.
+    with_sweep needs the serial path.
+
+    Returns:
+    - dict: the summary as plain dicts, ready for json.dump. With with_ledger=True and/or
+      with_sweep=True, a tuple of that followed by the JamLedger and/or the JamThresholdSweep.
+    """
+    machine_files = expand_machine_files(machine_csv)
+    if not machine_files:
+        raise FileNotFoundError(f"no machine CSVs match {machine_csv}")
+    if (workers is not None or shard_period) and with_sweep:
+        raise ValueError("sweeps need the annotated entries; run them without workers or shards")
+    schedule_data = CompiledSchedule(process_shift_schedule_combined_dict(schedule_csv))
+    streaming = (len(machine_files) == 1 and not cache_dir and workers is None and not shard_period
+                 and not with_sweep)
+
+    updated_data = None
+    if streaming:
+        stats = {}
+        (summarized_data, jam_count_by_shift, overall_jam_count, ledger), datetime_range = (
+            summarize_machine_data_streaming(machine_files[0], schedule_data, with_ledger=True, split=split,
+                                             compact=compact, stats=stats))
+        subsecond_entries = stats['subsecond_entries']
+    else:
+        if len(machine_files) == 1 and cache_dir:
+            machine_data, datetime_range = parse_machine_data_cached(machine_files[0], cache_dir)
+        elif len(machine_files) == 1:
+            machine_data, datetime_range = parse_machine_data(machine_files[0])
+        else:
+            machine_data, datetime_range = parse_machine_files(machine_files)
+        subsecond_entries = count_subsecond_entries(machine_data) if compact else 0
+        machine_data = prepare_machine_entries(machine_data, schedule_data, split, compact)
+        if shard_period:
+            summarized_data, jam_count_by_shift, overall_jam_count, ledger = summarize_machine_data_time_sharded(
+                machine_data, schedule_data, shard_period, workers, with_ledger=True)
+        elif workers is not None:
+            summarized_data, jam_count_by_shift, overall_jam_count, ledger = summarize_machine_data_parallel(
+                machine_data, schedule_data, workers, with_ledger=True)
+        else:
+            updated_data = update_machine_data(machine_data, schedule_data)
+            summarized_data, jam_count_by_shift, overall_jam_count, ledger = summarize_machine_entries_with_exclusion(
+                updated_data, vectorized=True, with_ledger=True)
+
+    summary = {
+        'machine_csv': os.path.abspath(machine_csv),
+        'machine_files': len(machine_files),
+        'schedule_csv': os.path.abspath(schedule_csv),
+        'datetime_range': [str(value) for value in datetime_range],
+        'durations': {shift: {machine: dict(states) for machine, states in machines.items()}
+                      for shift, machines in summarized_data.items()},
+        'jam_count_by_shift': {shift: dict(machines) for shift, machines in jam_count_by_shift.items()},
+        'overall_jam_count': dict(overall_jam_count),
+    }
+    if compact:
+        summary['subsecond_entries'] = subsecond_entries
+    extras = ((ledger,) if with_ledger else ()) + ((JamThresholdSweep.from_entries(updated_data),) if with_sweep else ())
+    return (summary,) + extras if extras else summary
+
+def write_summary_csv(summary, file_path):
+    """ Writes a summary as rows of Shift, Machine, State, Seconds, with jam counts as State "JAMS". """
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Shift', 'Machine', 'State', 'Seconds'])
+        for shift, machines in summary['durations'].items():
+            for machine, states in machines.items():
+                for state, seconds in states.items():
+                    writer.writerow([shift, machine, state, repr(seconds)])
+                jams = summary['jam_count_by_shift'].get(shift, {}).get(machine, 0)
+                writer.writerow([shift, machine, 'JAMS', jams])
+        for machine, jams in summary['overall_jam_count'].items():
+            writer.writerow(['ALL', machine, 'JAMS', jams])
+
+def summary_name(machine_csv):
+    """ Returns the output name of a machine CSV: its file name, or the folder/pattern name without wildcards. """
+    path = machine_csv.rstrip('/\\')
+    while path:
+        name = os.path.splitext(os.path.basename(path))[0].replace('*', '').replace('?', '').strip('_-. ')
+        if name:
+            return name
+        path = os.path.dirname(path)
+    return 'machines'
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Summarize machine state durations and jams per shift without the GUI.")
+    parser.add_argument('machine_csvs', nargs='*', metavar='MACHINE_CSV',
+                        help="machine CSVs to summarize with --schedule")
+    parser.add_argument('-s', '--schedule', help="schedule CSV for the MACHINE_CSV arguments")
+    parser.add_argument('-p', '--pair', nargs=2, action='append', default=[], metavar=('MACHINE_CSV', 'SCHEDULE_CSV'),
+                        help="a machine CSV and the schedule CSV to use with it; may be repeated")
+    parser.add_argument('-o', '--output-dir', default='.', help="directory for the summaries (default: current directory)")
+    parser.add_argument('-c', '--cache', nargs='?', const=default_cache_dir(), metavar='DIR',
+                        help="keep parsed machine CSVs as binary event stores in DIR and reuse them while the "
+                             "CSV is unchanged (default DIR: ~/.jammer_time/cache)")
+    parser.add_argument('--split-boundaries', action='store_true',
+                        help="charge rows that run past a shift or break boundary by the exact seconds on each side")
+    parser.add_argument('--compact', action='store_true',
+                        help="merge consecutive rows in the same state before annotating (faster; same results when "
+                             "timestamps are whole seconds, otherwise up to float rounding)")
+    parser.add_argument('--workers', type=int, metavar='N',
+                        help="annotate and summarize each machine line on its own worker process, N at a time "
+                             "(0: one per CPU)")
+    parser.add_argument('--shard-period', choices=['W', 'M'],
+                        help="also cut each machine line into week (W) or month (M) shards for the workers, for "
+                             "long histories of few lines (default workers: one per CPU)")
+    parser.add_argument('--sweep-thresholds', nargs='+', type=float, metavar='SECONDS',
+                        help="also write the jams each of these jam thresholds would give (default threshold: "
+                             f"{JAM_THRESHOLD_SECONDS} s)")
+    parser.add_argument('--sweep-defaults', nargs='+', type=float, metavar='SECONDS',
+                        help="also write the jams and last-entry seconds each of these default durations "
+                             "for a machine's last entry would give")
+    parser.add_argument('-f', '--format', choices=['json', 'csv', 'both'], default='json', help="output format (default: json)")
+    args = parser.parse_args(argv)
+
+    if args.machine_csvs and not args.schedule:
+        parser.error("--schedule is required with MACHINE_CSV arguments")
+    if not args.machine_csvs and not args.pair:
+        parser.error("give MACHINE_CSV arguments with --schedule, or --pair")
+    if (args.workers is not None or args.shard_period) and (args.sweep_thresholds or args.sweep_defaults):
+        parser.error("--sweep-thresholds and --sweep-defaults cannot be combined with --workers or --shard-period")
+    return args
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    pairs = [(machine_csv, args.schedule) for machine_csv in args.machine_csvs] + [tuple(pair) for pair in args.pair]
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    failures = 0
+    for machine_csv, schedule_csv in pairs:
+        name = summary_name(machine_csv)
+        try:
+            sweeping = bool(args.sweep_thresholds or args.sweep_defaults)
+            summary, ledger, *sweep = summarize_pair(machine_csv, schedule_csv, args.cache, args.split_boundaries,
+                                                     args.compact, with_ledger=True, with_sweep=sweeping,
+                                                     workers=args.workers, shard_period=args.shard_period)
+            ledger.save(os.path.join(args.output_dir, f"{name}.jams.npz"),
+                        {'machine_csv': summary['machine_csv'], 'schedule_csv': summary['schedule_csv']})
+            if args.format in ('json', 'both'):
+                with open(os.path.join(args.output_dir, f"{name}.summary.json"), 'w') as file:
+                    json.dump(summary, file, indent=2)
+            if args.format in ('csv', 'both'):
+                write_summary_csv(summary, os.path.join(args.output_dir, f"{name}.summary.csv"))
+                ledger.to_frame().to_csv(os.path.join(args.output_dir, f"{name}.jams.csv"), index=False)
+            if args.sweep_thresholds:
+                sweep[0].thresholds(args.sweep_thresholds).to_csv(
+                    os.path.join(args.output_dir, f"{name}.thresholds.csv"), index=False)
+            if args.sweep_defaults:
+                sweep[0].default_durations(args.sweep_defaults).to_csv(
+                    os.path.join(args.output_dir, f"{name}.defaults.csv"), index=False)
+            if summary.get('subsecond_entries'):
+                print(f"{machine_csv}: note: {summary['subsecond_entries']} row(s) have sub-second timestamps, "
+                      "so --compact seconds can differ from a full run by float rounding", file=sys.stderr)
+            print(f"{machine_csv}: {sum(summary['overall_jam_count'].values())} jam(s)")
+        except Exception as e:
+            # Keep going so one bad file does not stop a nightly run
+            failures += 1
+            print(f"{machine_csv}: error: {e}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,2224 @@
+"""
+Jam summary pipeline of Machine_State_Calculator: parsing the schedule and machine CSVs,
+annotating entries with shifts and breaks, and summarizing state durations and jams.
+
+Nothing here imports Qt, so the pipeline can run headless (see machine_state_cli.py).
+"""
+import os
+import io
+import mmap
+import struct
+import copy
+import csv
+import glob
+import json
+import pickle
+import hashlib
+import importlib.util
+import contextlib
+import functools
+import tracemalloc
+from time import perf_counter, thread_time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from datetime import time
+from collections import defaultdict
+
+# Consecutive ERROR time at or above this is treated as maintenance/closure, not a jam
+JAM_THRESHOLD_SECONDS = 3600
+
+# Duration given to each machine's last entry (and the last entry before a gap in the data)
+DEFAULT_DURATION_SECONDS = 180
+
+# Weekday name -> index (0 for Monday, 1 for Tuesday, etc.)
+WEEKDAY_INDEX = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6}
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+NS_PER_WEEK = 7 * NS_PER_DAY
+
+def summarize_machine_entries_with_exclusion(updated_data, vectorized=False, with_ledger=False, with_cube=False):
+    """
+    Goes through machine entries (already annotated with shift codes, breaks, etc.)
+    and:
+    1) Sums durations for each machine state per shift code (result).
+    2) Tracks jam counts in two ways:
+       - jam_count_by_shift[shift_code][machine] = number of jam events for that shift
+       - overall_jam_count[machine] = total jam events across all shifts
+
+    A "jam" = a valid consecutive ERROR block under 1 hour,
+    not interrupted by breaks/shift crossovers.
+
+    updated_data is an annotated MachineEntries (or the older dict of entry tuples).
+    With vectorized=True the same results are computed by summarize_machine_entries_vectorized.
+    With with_ledger=True a JamLedger of the jams found is returned as a fourth item, and with
+    with_cube=True (always vectorized) a SummaryCube of the results by day after that.
+    """
+    if vectorized or with_cube:
+        return summarize_machine_entries_vectorized(updated_data, with_ledger, with_cube)
+    shift_order = []
+    if isinstance(updated_data, MachineEntries):
+        shift_order = [f"SC:{code}" for code in updated_data.shift_codes]
+        updated_data = updated_data.to_tuples()
+
+    # Durations for each shift_code -> machine -> state
+    result = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+
+    # Jam counts:
+    jam_count_by_shift = defaultdict(lambda: defaultdict(int))
+    overall_jam_count = defaultdict(int)
+
+    skip_consecutive_errors = defaultdict(bool)
+    error_entries_buffer = defaultdict(list)
+    error_duration_buffer = defaultdict(float)
+
+    # Jam events per machine: (start, end, summed ERROR seconds, shift codes)
+    jam_events = {machine: [] for machine in updated_data}
+
+    for machine, entries in updated_data.items():
+        for entry in entries:
+            timestamp, state, weekday, duration, *codes = entry
+            shift_codes = [c for c in codes if c.startswith("SC:")]
+            is_break = ('break' in codes)
+            is_shiftcrossover = ('shiftcrossover' in codes)
+
+            # 1) If break or shift crossover, reset current error buffer
+            if is_break or is_shiftcrossover:
+                error_entries_buffer[machine].clear()
+                error_duration_buffer[machine] = 0.0
+                skip_consecutive_errors[machine] = True
+                continue
+
+            # 2) If skipping errors (set true after a break/crossover), ignore ERROR
+            if state == "ERROR" and skip_consecutive_errors[machine]:
+                continue
+
+            # 3) If we see an ERROR, accumulate in the buffer
+            if state == "ERROR":
+                error_entries_buffer[machine].append((timestamp, state, weekday, duration, shift_codes))
+                error_duration_buffer[machine] += duration
+                continue
+
+            # 4) We hit a NON-ERROR; check the buffer
+            if error_duration_buffer[machine] >= JAM_THRESHOLD_SECONDS:
+                # Discard buffer if total errors >= 1 hour
+                error_entries_buffer[machine].clear()
+                error_duration_buffer[machine] = 0.0
+            else:
+                # If we actually have an error buffer, it's a valid jam event
+                if error_entries_buffer[machine]:
+                    # Gather all shift codes in the buffer
+                    shifts_in_block = set()
+                    for buf_ts, buf_state, buf_wd, buf_dur, buf_codes in error_entries_buffer[machine]:
+                        for sc in buf_codes:
+                            if sc.startswith("SC:"):
+                                shifts_in_block.add(sc)
+
+                    # Increment jam counts for each shift code involved
+                    for sc in shifts_in_block:
+                        jam_count_by_shift[sc][machine] += 1
+
+                    # Also increment the overall machine jam count
+                    overall_jam_count[machine] += 1
+
+                    first_ts = error_entries_buffer[machine][0][0]
+                    last_ts, last_dur = error_entries_buffer[machine][-1][0], error_entries_buffer[machine][-1][3]
+                    jam_events[machine].append((first_ts, last_ts + pd.Timedelta(seconds=last_dur),
+                                                error_duration_buffer[machine], shifts_in_block))
+
+                # Flush these ERROR durations to the final result
+                while error_entries_buffer[machine]:
+                    buf_ts, buf_state, buf_wd, buf_dur, buf_codes = error_entries_buffer[machine].pop(0)
+                    # Each error's duration is split across its shift codes
+                    if buf_codes:
+                        split_duration = buf_dur / len(buf_codes)
+                        for sc in buf_codes:
+                            if sc.startswith("SC:"):
+                                result[sc][machine][buf_state] += split_duration
+
+            # 5) Reset
+            error_duration_buffer[machine] = 0.0
+            skip_consecutive_errors[machine] = False
+
+            # 6) Handle non-ERROR states
+            if shift_codes and state != "ERROR":
+                split_duration = duration / len(shift_codes)
+                for sc in shift_codes:
+                    result[sc][machine][state] += split_duration
+
+    if with_ledger:
+        return result, jam_count_by_shift, overall_jam_count, JamLedger.from_events(jam_events, shift_order)
+    return result, jam_count_by_shift, overall_jam_count
+
+
+def machine_contributions(durations, state_ids, error_id, shift_masks, resets, n_shifts, n_states, previous_reset=False):
+    """
+    Run-length version of the summarize_machine_entries_with_exclusion state machine for one machine.
+
+    Parameters:
+    - durations (float array): duration of each entry in seconds.
+    - state_ids (int array): state of each entry, below n_states.
+    - error_id (int): state id of "ERROR", or -1 if it has not been seen.
+    - shift_masks (int array): shift bitmask of each entry, with n_shifts bits in use.
+    - resets (bool array): True for entries in a break or shift crossover.
+    - previous_reset (bool): whether the entry before these was a break or shift crossover.
+
+    An ERROR run still open at the end of the entries is never counted, the same as the loop.
+
+    Returns:
+    - tuple: (keys, weights, rows, jams_by_shift, jams, jam_events). Adding weights[i] (from entry
+      rows[i]) to [shift, state] cell keys[i] (shift * n_states + state), in order, gives the summed
+      durations; jams_by_shift[shift]
+      counts the jams that involved the shift and jams is the number of jams found. jam_events
+      holds, per jam, the rows of its first and last ERROR entry, its summed duration and the
+      OR of its shift bits, as the arrays (first_rows, last_rows, durations, shift_masks).
+    """
+    is_error = (state_ids == error_id) & ~resets
+    error_rows, run_ids, run_starts, run_ends, run_durations, candidates = error_runs(
+        durations, is_error, resets, previous_reset)
+    jam_runs = candidates & (run_durations < JAM_THRESHOLD_SECONDS)
+
+    # Shifts involved in each jam: OR together the shift bits of the run's entries
+    jams_by_shift = np.zeros(n_shifts, dtype=np.int64)
+    run_masks = np.zeros(len(run_starts), dtype=np.int64)
+    if len(run_starts):
+        run_masks = np.bitwise_or.reduceat(shift_masks[error_rows], np.searchsorted(error_rows, run_starts))
+        for shift in range(n_shifts):
+            jams_by_shift[shift] = np.count_nonzero(jam_runs & (run_masks >> shift & 1).astype(bool))
+    jam_events = (run_starts[jam_runs], run_ends[jam_runs], run_durations[jam_runs], run_masks[jam_runs])
+
+    # Non-break entries and the ERROR entries of jams are charged to their shifts,
+    # each shift getting an even split of the duration
+    included = ~resets & ~is_error
+    included[error_rows[jam_runs[run_ids]]] = True
+    in_shift = [(shift_masks >> shift & 1).astype(bool) for shift in range(n_shifts)]
+    shift_counts = np.sum(in_shift, axis=0) if n_shifts else np.zeros(len(durations), dtype=np.int64)
+    keys, weights, rows = [np.zeros(0, dtype=np.int64)], [np.zeros(0)], [np.zeros(0, dtype=np.int64)]
+    for shift in range(n_shifts):
+        # Entry order within each shift is kept, which is all the order each cell depends on
+        charged = np.flatnonzero(included & in_shift[shift])
+        keys.append(shift * n_states + state_ids[charged])
+        weights.append(durations[charged] / shift_counts[charged])
+        rows.append(charged)
+
+    return (np.concatenate(keys), np.concatenate(weights), np.concatenate(rows), jams_by_shift,
+            int(np.count_nonzero(jam_runs)), jam_events)
+
+def error_runs(durations, is_error, resets, previous_reset=False):
+    """
+    Finds the runs of consecutive ERROR entries (is_error excludes breaks and crossovers) of one
+    machine. A run is a jam candidate when it follows a non-break entry (or starts the data, with
+    previous_reset False) and is ended by a non-break, non-ERROR entry; a candidate is a jam
+    when its summed duration is under JAM_THRESHOLD_SECONDS.
+
+    Returns:
+    - tuple: (error_rows, run_ids, run_starts, run_ends, run_durations, candidates). error_rows
+      are the rows of the ERROR entries and run_ids the run of each; run_starts and run_ends the
+      first and last row of each run, run_durations its summed duration and candidates whether
+      it is a jam candidate.
+    """
+    previous_error = np.concatenate(([False], is_error[:-1]))
+    next_error = np.concatenate((is_error[1:], [False]))
+    run_starts = np.flatnonzero(is_error & ~previous_error)
+    run_ends = np.flatnonzero(is_error & ~next_error)
+    error_rows = np.flatnonzero(is_error)
+    run_ids = np.cumsum(is_error & ~previous_error)[error_rows] - 1
+
+    skipped = np.zeros(len(run_starts), dtype=bool)
+    has_previous = run_starts > 0
+    skipped[has_previous] = resets[run_starts[has_previous] - 1]
+    skipped[~has_previous] = previous_reset
+    closed = np.zeros(len(run_ends), dtype=bool)
+    has_next = run_ends + 1 < len(durations)
+    closed[has_next] = ~resets[run_ends[has_next] + 1]
+
+    # bincount adds in entry order, so the sums match the loop bit for bit
+    run_durations = np.bincount(run_ids, weights=durations[error_rows], minlength=len(run_starts))
+    return error_rows, run_ids, run_starts, run_ends, run_durations, ~skipped & closed
+
+def summarize_machine_arrays(durations, state_ids, error_id, shift_masks, resets, totals, counts, previous_reset=False):
+    """
+    Adds the machine_contributions of one machine's entries to its [shift, state] totals
+    (seconds) and counts (entries charged), in place.
+    Returns (keys, weights, rows, jams_by_shift, jams, jam_events), as machine_contributions.
+    """
+    contributions = machine_contributions(
+        durations, state_ids, error_id, shift_masks, resets, totals.shape[0], totals.shape[1], previous_reset)
+    keys, weights = contributions[:2]
+    # add.at is unbuffered and goes in entry order, so each total matches the loop bit for bit
+    np.add.at(totals.reshape(-1), keys, weights)
+    np.add.at(counts.reshape(-1), keys, 1)
+    return contributions
+
+def empty_jam_events():
+    return {'starts': np.zeros(0, dtype=np.int64), 'ends': np.zeros(0, dtype=np.int64),
+            'durations': np.zeros(0), 'shift_masks': np.zeros(0, dtype=np.int64)}
+
+class MachineSummary:
+    """ Running totals, jam counts and carried-over state of one machine in a SummaryState. """
+
+    def __init__(self, n_shifts, n_states):
+        self.totals = np.zeros((n_shifts, n_states), dtype=np.float64)
+        self.counts = np.zeros((n_shifts, n_states), dtype=np.int64)
+        self.jams_by_shift = np.zeros(n_shifts, dtype=np.int64)
+        self.jams = 0
+        # Whether the last summarized entry was a break or shift crossover (the skip flag)
+        self.previous_reset = False
+        # Trailing ERROR entries whose run has not ended yet, as columns
+        self.pending = {'timestamps': np.zeros(0, dtype=np.int64), 'durations': np.zeros(0),
+                        'state_ids': np.zeros(0, dtype=np.int64), 'shift_masks': np.zeros(0, dtype=np.int64),
+                        'resets': np.zeros(0, dtype=bool)}
+        # The jams found so far, as JamLedger columns
+        self.jam_events = empty_jam_events()
+        # Totals and counts per day when the SummaryState keeps them (by_day), of shape
+        # (days, shifts, states) for days first_day, first_day + 1, ... since the epoch. Only the
+        # first n_days rows are in use; the rest is spare capacity for the days still to come
+        self.first_day = None
+        self.n_days = 0
+        self.day_totals = np.zeros((0, n_shifts, n_states), dtype=np.float64)
+        self.day_counts = np.zeros((0, n_shifts, n_states), dtype=np.int64)
+
+    def add_days(self, keys, weights, days):
+        """ Adds machine_contributions keys and weights, each charged on the given day, to the per-day totals. """
+        if not len(days):
+            return
+        low, high = int(days.min()), int(days.max())
+        if self.first_day is None:
+            self.first_day = low
+        start = min(low, self.first_day)
+        stop = max(high + 1, self.first_day + self.n_days)
+        if start < self.first_day or stop - self.first_day > len(self.day_totals):
+            # Grow the capacity geometrically, so adding a day at a time copies each day O(1) times
+            capacity = max(stop - start, 2 * len(self.day_totals))
+            before = self.first_day - start
+            day_totals = np.zeros((capacity,) + self.totals.shape)
+            day_counts = np.zeros((capacity,) + self.counts.shape, dtype=np.int64)
+            day_totals[before:before + self.n_days] = self.day_totals[:self.n_days]
+            day_counts[before:before + self.n_days] = self.day_counts[:self.n_days]
+            self.day_totals, self.day_counts, self.first_day = day_totals, day_counts, start
+        self.n_days = stop - self.first_day
+        cells = (days - self.first_day) * self.totals.size + keys
+        np.add.at(self.day_totals.reshape(-1), cells, weights)
+        np.add.at(self.day_counts.reshape(-1), cells, 1)
+
+    def add_jam_events(self, timestamps, durations, jam_events):
+        """ Appends the jam_events of machine_contributions, given the timestamps and durations of its rows. """
+        first_rows, last_rows, jam_durations, jam_masks = jam_events
+        ends = timestamps[last_rows] + np.round(durations[last_rows] * 1e9).astype(np.int64)
+        added = {'starts': timestamps[first_rows], 'ends': ends, 'durations': jam_durations, 'shift_masks': jam_masks}
+        self.jam_events = {name: np.concatenate((column, added[name])) for name, column in self.jam_events.items()}
+
+    def grow(self, n_states):
+        """ Widens the state columns when new states have been seen. """
+        extra = n_states - self.totals.shape[1]
+        if extra > 0:
+            self.totals = np.pad(self.totals, ((0, 0), (0, extra)))
+            self.counts = np.pad(self.counts, ((0, 0), (0, extra)))
+            self.day_totals = np.pad(self.day_totals, ((0, 0), (0, 0), (0, extra)))
+            self.day_counts = np.pad(self.day_counts, ((0, 0), (0, 0), (0, extra)))
+
+class SummaryState:
+    """
+    Running result of the jam summarizer, fed annotated MachineEntries in time order.
+
+    A machine's trailing ERROR entries are held back until a later update shows how the run
+    ends, so summarizing a file chunk by chunk gives exactly the same results as summarizing
+    it whole. Everything is kept in lists and NumPy arrays, so the state pickles. With by_day,
+    totals are also kept per day of each entry's timestamp, for cube().
+    """
+
+    def __init__(self, shift_codes=(), by_day=False):
+        self.shift_codes = list(shift_codes)
+        self.by_day = by_day
+        self.states = []
+        self.machines = {}
+
+    def fork(self):
+        """ Returns an independent copy of the state. """
+        return copy.deepcopy(self)
+
+    def update(self, updated_data):
+        """ Summarizes the next annotated MachineEntries, continuing each machine where it left off. """
+        if not self.machines and not self.shift_codes:
+            self.shift_codes = list(updated_data.shift_codes)
+        elif updated_data.shift_codes and list(updated_data.shift_codes) != self.shift_codes:
+            raise ValueError("Entries were annotated with a different schedule than the summary.")
+
+        # Map the chunk's state codes onto the states seen so far
+        for state in updated_data.states:
+            if state not in self.states:
+                self.states.append(state)
+        state_map = np.array([self.states.index(state) for state in updated_data.states], dtype=np.int64)
+        error_id = self.states.index("ERROR") if "ERROR" in self.states else -1
+
+        for machine in updated_data.machines:
+            rows = updated_data.rows(machine)
+            if machine not in self.machines:
+                self.machines[machine] = MachineSummary(len(self.shift_codes), len(self.states))
+            summary = self.machines[machine]
+            summary.grow(len(self.states))
+
+            pending = summary.pending
+            columns = {
+                'timestamps': np.concatenate((pending['timestamps'], updated_data.timestamps[rows])),
+                'durations': np.concatenate((pending['durations'], updated_data.durations[rows])),
+                'state_ids': np.concatenate((pending['state_ids'], state_map[updated_data.state_codes[rows]])),
+                'shift_masks': np.concatenate((pending['shift_masks'], updated_data.shift_masks[rows])),
+                'resets': np.concatenate((pending['resets'], updated_data.flags[rows] != 0)),
+            }
+
+            # Hold back everything after the last entry that is not an unbroken ERROR
+            settled = np.flatnonzero((columns['state_ids'] != error_id) | columns['resets'])
+            cut = int(settled[-1]) + 1 if len(settled) else 0
+            if cut:
+                keys, weights, charged, jams_by_shift, jams, jam_events = summarize_machine_arrays(
+                    columns['durations'][:cut], columns['state_ids'][:cut], error_id,
+                    columns['shift_masks'][:cut], columns['resets'][:cut],
+                    summary.totals, summary.counts, summary.previous_reset)
+                if self.by_day:
+                    summary.add_days(keys, weights, columns['timestamps'][charged] // NS_PER_DAY)
+                summary.jams_by_shift += jams_by_shift
+                summary.jams += jams
+                summary.add_jam_events(columns['timestamps'], columns['durations'], jam_events)
+                summary.previous_reset = bool(columns['resets'][cut - 1])
+            summary.pending = {name: column[cut:] for name, column in columns.items()}
+
+    def merge(self, other):
+        """ Adds the machines of another state, summarized separately, to this one. """
+        if other.shift_codes != self.shift_codes:
+            raise ValueError("Summaries were made with different schedules.")
+        for state in other.states:
+            if state not in self.states:
+                self.states.append(state)
+        state_map = np.array([self.states.index(state) for state in other.states], dtype=np.int64)
+
+        for machine, summary in other.machines.items():
+            if machine in self.machines:
+                raise ValueError(f"Machine {machine} is in both summaries.")
+            merged = MachineSummary(len(self.shift_codes), len(self.states))
+            merged.totals[:, state_map] = summary.totals
+            merged.counts[:, state_map] = summary.counts
+            merged.jams_by_shift = summary.jams_by_shift.copy()
+            merged.jams = summary.jams
+            merged.jam_events = dict(summary.jam_events)
+            if summary.first_day is not None:
+                merged.first_day, merged.n_days = summary.first_day, summary.n_days
+                merged.day_totals = np.zeros((summary.n_days,) + merged.totals.shape)
+                merged.day_counts = np.zeros((summary.n_days,) + merged.counts.shape, dtype=np.int64)
+                merged.day_totals[:, :, state_map] = summary.day_totals[:summary.n_days]
+                merged.day_counts[:, :, state_map] = summary.day_counts[:summary.n_days]
+            merged.previous_reset = summary.previous_reset
+            merged.pending = dict(summary.pending, state_ids=state_map[summary.pending['state_ids']])
+            self.machines[machine] = merged
+
+    def results(self, with_ledger=False, with_cube=False):
+        """
+        Returns (result, jam_count_by_shift, overall_jam_count) in the form of
+        summarize_machine_entries_with_exclusion, plus jam_ledger() with with_ledger=True and
+        then cube() with with_cube=True. ERROR runs still pending are left out.
+        """
+        result = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+        jam_count_by_shift = defaultdict(lambda: defaultdict(int))
+        overall_jam_count = defaultdict(int)
+
+        for machine, summary in self.machines.items():
+            for shift, state in zip(*np.nonzero(summary.counts)):
+                result[f"SC:{self.shift_codes[shift]}"][machine][self.states[state]] = float(summary.totals[shift, state])
+            for shift in np.flatnonzero(summary.jams_by_shift):
+                jam_count_by_shift[f"SC:{self.shift_codes[shift]}"][machine] = int(summary.jams_by_shift[shift])
+            if summary.jams:
+                overall_jam_count[machine] = summary.jams
+
+        return ((result, jam_count_by_shift, overall_jam_count) + ((self.jam_ledger(),) if with_ledger else ())
+                + ((self.cube(),) if with_cube else ()))
+
+    def jam_ledger(self):
+        """ Returns the jams found so far as a JamLedger. """
+        return JamLedger.from_columns({machine: summary.jam_events for machine, summary in self.machines.items()},
+                                      self.shift_codes)
+
+    def cube(self):
+        """
+        Returns the totals so far as a SummaryCube. Needs a state made with by_day; jams are
+        counted on the day of their first ERROR entry.
+        """
+        if not self.by_day:
+            raise ValueError("The summary was not kept by day; make it with SummaryState(by_day=True).")
+        machines = list(self.machines)
+        summaries = [self.machines[machine] for machine in machines]
+        starts = [summary.jam_events['starts'] // NS_PER_DAY for summary in summaries]
+        days = []
+        for summary, jam_days in zip(summaries, starts):
+            if summary.first_day is not None:
+                days += [summary.first_day, summary.first_day + summary.n_days - 1]
+            if len(jam_days):
+                days += [int(jam_days.min()), int(jam_days.max())]
+        first_day = min(days) if days else 0
+        n_days = max(days) - first_day + 1 if days else 0
+
+        shape = (n_days, len(self.shift_codes), len(machines), len(self.states))
+        seconds, counts = np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        jams_by_shift = np.zeros(shape[:3], dtype=np.int64)
+        jams = np.zeros((n_days, len(machines)), dtype=np.int64)
+        for i, (summary, jam_days) in enumerate(zip(summaries, starts)):
+            if summary.first_day is not None:
+                offset = summary.first_day - first_day
+                used = slice(offset, offset + summary.n_days)
+                seconds[used, :, i, :summary.day_totals.shape[2]] = summary.day_totals[:summary.n_days]
+                counts[used, :, i, :summary.day_counts.shape[2]] = summary.day_counts[:summary.n_days]
+            np.add.at(jams[:, i], jam_days - first_day, 1)
+            for shift in range(len(self.shift_codes)):
+                np.add.at(jams_by_shift[:, shift, i], jam_days - first_day, summary.jam_events['shift_masks'] >> shift & 1)
+        return SummaryCube(machines, self.shift_codes, self.states, first_day, seconds, counts, jams_by_shift, jams)
+
+class SummaryCube:
+    """
+    Durations and jams pre-aggregated by day, shift, machine and state, so the results for any
+    range of days and subset of machines are a sum over a slice instead of a new calculation.
+
+    Days are first_day, first_day + 1, ... (days since the epoch of each entry's timestamp).
+    Arrays:
+    - seconds (float64) and counts (int64), shape (days, shifts, machines, states): summed
+      durations and entries charged, as SummaryState totals and counts
+    - jams_by_shift (int64), shape (days, shifts, machines): jams that involved each shift
+    - jams (int64), shape (days, machines): jams, on the day of their first ERROR entry
+    """
+
+    def __init__(self, machines, shift_codes, states, first_day, seconds, counts, jams_by_shift, jams):
+        self.machines = list(machines)
+        self.shift_codes = list(shift_codes)
+        self.states = list(states)
+        self.first_day = int(first_day)
+        self.seconds = np.asarray(seconds, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.jams_by_shift = np.asarray(jams_by_shift, dtype=np.int64)
+        self.jams = np.asarray(jams, dtype=np.int64)
+
+    def dates(self):
+        """ Returns the date of each day in the cube. """
+        return [pd.Timestamp((self.first_day + day) * NS_PER_DAY).date() for day in range(len(self.jams))]
+
+    def day_index(self, value):
+        """ Returns the day index of a date, datetime or Timestamp (which may lie outside the cube). """
+        return int(to_epoch_ns([pd.Timestamp(value).normalize()])[0] // NS_PER_DAY) - self.first_day
+
+    def results(self, start=None, end=None, machines=None):
+        """
+        Returns (result, jam_count_by_shift, overall_jam_count) in the form of
+        summarize_machine_entries_with_exclusion for the days from start to end, both included
+        (dates; None for no limit), and the given machines (default: all).
+        """
+        low = 0 if start is None else max(self.day_index(start), 0)
+        high = len(self.jams) if end is None else max(self.day_index(end) + 1, low)
+        columns = [i for i, machine in enumerate(self.machines) if machines is None or machine in set(machines)]
+        seconds = self.seconds[low:high, :, columns].sum(axis=0)
+        counts = self.counts[low:high, :, columns].sum(axis=0)
+        jams_by_shift = self.jams_by_shift[low:high, :, columns].sum(axis=0)
+        jams = self.jams[low:high, columns].sum(axis=0)
+
+        result = defaultdict(lambda: defaultdict(lambda: defaultdict(float)))
+        jam_count_by_shift = defaultdict(lambda: defaultdict(int))
+        overall_jam_count = defaultdict(int)
+        for i, column in enumerate(columns):
+            machine = self.machines[column]
+            for shift, state in zip(*np.nonzero(counts[:, i])):
+                result[f"SC:{self.shift_codes[shift]}"][machine][self.states[state]] = float(seconds[shift, i, state])
+            for shift in np.flatnonzero(jams_by_shift[:, i]):
+                jam_count_by_shift[f"SC:{self.shift_codes[shift]}"][machine] = int(jams_by_shift[shift, i])
+            if jams[i]:
+                overall_jam_count[machine] = int(jams[i])
+        return result, jam_count_by_shift, overall_jam_count
+
+class JamLedger:
+    """
+    Table of individual jams, kept as columns sorted by machine and then start time, so the
+    jams of a machine (rows) or a time range (select) are found with a binary search.
+
+    Rows are grouped by machine (machines[i] owns rows offsets[i]:offsets[i + 1]). Columns:
+    - starts (int64): wall-clock nanoseconds of the jam's first ERROR entry
+    - ends (int64): the same for the end of its last ERROR entry (its timestamp plus duration)
+    - durations (float64): summed duration of the ERROR entries in seconds, the value compared
+      with JAM_THRESHOLD_SECONDS
+    - shift_masks (int64): bit i set when the jam involved shift_codes[i]
+    """
+
+    def __init__(self, machines, offsets, starts, ends, durations, shift_masks, shift_codes):
+        self.machines = list(machines)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.shift_masks = np.asarray(shift_masks, dtype=np.int64)
+        self.shift_codes = list(shift_codes)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def rows(self, machine):
+        """ Returns the slice of rows belonging to a machine. """
+        i = self.machines.index(machine)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    @classmethod
+    def from_columns(cls, columns, shift_codes):
+        """ Builds the ledger from {machine: {'starts', 'ends', 'durations', 'shift_masks'}}, each in time order. """
+        machines = list(columns)
+        offsets = np.concatenate(([0], np.cumsum([len(columns[machine]['starts']) for machine in machines],
+                                                 dtype=np.int64)))
+        joined = {name: np.concatenate([columns[machine][name] for machine in machines] or [column])
+                  for name, column in empty_jam_events().items()}
+        return cls(machines, offsets, joined['starts'], joined['ends'], joined['durations'], joined['shift_masks'],
+                   shift_codes)
+
+    @classmethod
+    def from_events(cls, jam_events, shift_codes=()):
+        """
+        Builds the ledger from {machine: [(start, end, seconds, shift codes), ...]}, as collected
+        by the loop in summarize_machine_entries_with_exclusion. Shift codes ("SC:..." or bare)
+        not in shift_codes are numbered in the order they are first seen.
+        """
+        shift_codes = [code[len("SC:"):] if code.startswith("SC:") else code for code in shift_codes]
+        columns = {}
+        for machine, events in jam_events.items():
+            masks = []
+            for _, _, _, codes in events:
+                mask = 0
+                for code in sorted(codes):
+                    code = code[len("SC:"):] if code.startswith("SC:") else code
+                    if code not in shift_codes:
+                        shift_codes.append(code)
+                    mask |= 1 << shift_codes.index(code)
+                masks.append(mask)
+            columns[machine] = {
+                'starts': to_epoch_ns([event[0] for event in events]) if events else np.zeros(0, dtype=np.int64),
+                'ends': to_epoch_ns([event[1] for event in events]) if events else np.zeros(0, dtype=np.int64),
+                'durations': np.array([event[2] for event in events], dtype=np.float64),
+                'shift_masks': np.array(masks, dtype=np.int64),
+            }
+        return cls.from_columns(columns, shift_codes)
+
+    def select(self, machines=None, start=None, end=None):
+        """
+        Returns the jams of the given machines (default: all) starting at or after start and
+        before end (Timestamps, datetimes or nanoseconds; None for no limit), as a JamLedger.
+        """
+        machines = self.machines if machines is None else [machine for machine in machines if machine in self.machines]
+        low, high = (value if value is None or isinstance(value, (int, np.integer)) else int(to_epoch_ns([value])[0])
+                     for value in (start, end))
+        pieces = []
+        for machine in machines:
+            rows = self.rows(machine)
+            starts = self.starts[rows]
+            first = 0 if low is None else int(np.searchsorted(starts, low))
+            last = len(starts) if high is None else int(np.searchsorted(starts, high))
+            pieces.append(np.arange(rows.start + first, rows.start + last))
+        index = np.concatenate(pieces or [np.zeros(0, dtype=np.int64)]).astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum([len(piece) for piece in pieces], dtype=np.int64)))
+        return JamLedger(machines, offsets, self.starts[index], self.ends[index], self.durations[index],
+                         self.shift_masks[index], self.shift_codes)
+
+    def counts(self):
+        """
+        Returns (jam_count_by_shift, overall_jam_count) of the jams in the ledger, in the form of
+        summarize_machine_entries_with_exclusion.
+        """
+        jam_count_by_shift = defaultdict(lambda: defaultdict(int))
+        overall_jam_count = defaultdict(int)
+        for machine in self.machines:
+            masks = self.shift_masks[self.rows(machine)]
+            for bit, code in enumerate(self.shift_codes):
+                jams = int(np.count_nonzero(masks >> bit & 1))
+                if jams:
+                    jam_count_by_shift[f"SC:{code}"][machine] = jams
+            if len(masks):
+                overall_jam_count[machine] = len(masks)
+        return jam_count_by_shift, overall_jam_count
+
+    def to_frame(self):
+        """ Returns the jams as a DataFrame of Machine, Start, End, Seconds and Shifts (joined with ';'). """
+        shifts = [";".join(code for bit, code in enumerate(self.shift_codes) if mask >> bit & 1)
+                  for mask in self.shift_masks.tolist()]
+        return pd.DataFrame({
+            'Machine': np.repeat(np.array(self.machines, dtype=object), np.diff(self.offsets)),
+            'Start': pd.to_datetime(self.starts), 'End': pd.to_datetime(self.ends),
+            'Seconds': self.durations, 'Shifts': shifts,
+        })
+
+    def save(self, file_path, metadata=None):
+        """
+        Writes the columns to an uncompressed .npz file, with metadata stored as JSON next to them.
+        The file is written under a temporary name and moved into place, so readers never see half of it.
+        """
+        header = {'machines': self.machines, 'shift_codes': self.shift_codes, 'metadata': metadata or {}}
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, 'wb') as file:
+            np.savez(file, header=np.array(json.dumps(header, default=str)), offsets=self.offsets,
+                     starts=self.starts, ends=self.ends, durations=self.durations, shift_masks=self.shift_masks)
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def load(cls, file_path):
+        """ Reads a file written by save(), returning (JamLedger, metadata). """
+        with np.load(file_path) as columns:
+            header = json.loads(str(columns['header']))
+            ledger = cls(header['machines'], columns['offsets'], columns['starts'], columns['ends'],
+                         columns['durations'], columns['shift_masks'], header['shift_codes'])
+        return ledger, header['metadata']
+
+class JamThresholdSweep:
+    """
+    Every jam candidate (see error_runs) of annotated entries, found once, so the jams that
+    JAM_THRESHOLD_SECONDS or DEFAULT_DURATION_SECONDS would give can be read off for many
+    values at once instead of rerunning the summary for each.
+
+    Candidates are grouped by machine (machines[i] owns rows offsets[i]:offsets[i + 1]) and
+    sorted by duration within each machine. Columns:
+    - durations (float64): summed duration of the run's ERROR entries, as parsed
+    - defaults (int64): how many of those entries got the default duration (a machine's last
+      entry, or the last before a gap), so the run lasts durations + defaults * (d - default_duration)
+      with a default of d seconds
+    - shift_masks (int64): bit i set when the run involved shift_codes[i]
+
+    last_durations holds, per machine, the durations of the charged non-ERROR entries that got
+    the default duration, which a different default lengthens or shortens one for one.
+    """
+
+    def __init__(self, machines, offsets, durations, defaults, shift_masks, shift_codes, last_durations,
+                 default_duration=DEFAULT_DURATION_SECONDS):
+        self.machines = list(machines)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.defaults = np.asarray(defaults, dtype=np.int64)
+        self.shift_masks = np.asarray(shift_masks, dtype=np.int64)
+        self.shift_codes = list(shift_codes)
+        self.last_durations = [np.asarray(column, dtype=np.float64) for column in last_durations]
+        self.default_duration = default_duration
+
+    @classmethod
+    def from_entries(cls, updated_data, default_duration=DEFAULT_DURATION_SECONDS):
+        """
+        Finds the candidates of an annotated MachineEntries, parsed with default_duration.
+        An entry got the default when it is its machine's last or its duration is not the time
+        to the next entry.
+        """
+        error_id = updated_data.states.index("ERROR") if "ERROR" in updated_data.states else -1
+        columns, last_durations = [], []
+        for machine in updated_data.machines:
+            rows = updated_data.rows(machine)
+            durations = updated_data.durations[rows]
+            resets = updated_data.flags[rows] != 0
+            is_error = (updated_data.state_codes[rows] == error_id) & ~resets
+            steps = np.diff(updated_data.timestamps[rows]) / 1e9
+            got_default = np.concatenate((np.abs(durations[:-1] - steps) > 1e-6, [True])) if len(durations) \
+                else np.zeros(0, dtype=bool)
+
+            error_rows, run_ids, run_starts, _, run_durations, candidates = error_runs(durations, is_error, resets)
+            run_defaults = np.bincount(run_ids, weights=got_default[error_rows], minlength=len(run_starts))
+            run_masks = np.zeros(len(run_starts), dtype=np.int64)
+            if len(run_starts):
+                shift_masks = updated_data.shift_masks[rows]
+                run_masks = np.bitwise_or.reduceat(shift_masks[error_rows], np.searchsorted(error_rows, run_starts))
+            order = np.argsort(run_durations[candidates], kind='stable')
+            columns.append((run_durations[candidates][order], run_defaults[candidates][order].astype(np.int64),
+                            run_masks[candidates][order]))
+            charged = got_default & ~resets & ~is_error & (updated_data.shift_masks[rows] != 0)
+            last_durations.append(durations[charged])
+
+        offsets = np.concatenate(([0], np.cumsum([len(column[0]) for column in columns], dtype=np.int64)))
+        joined = [np.concatenate([column[i] for column in columns] or [np.zeros(0)]) for i in range(3)]
+        return cls(updated_data.machines, offsets, joined[0], joined[1], joined[2], updated_data.shift_codes,
+                   last_durations, default_duration)
+
+    def rows(self, machine):
+        """ Returns the slice of candidates belonging to a machine. """
+        i = self.machines.index(machine)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def thresholds(self, thresholds):
+        """
+        Returns the jams each threshold (a run is a jam when shorter) would give, as a DataFrame
+        with a row per threshold and machine: Threshold, Machine, Jams, Jam Seconds and the
+        jams involving each shift ("Jams SC:<code>").
+        """
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        frames = []
+        for machine in self.machines:
+            rows = self.rows(machine)
+            durations = self.durations[rows]
+            # Candidates are sorted, so the jams of a threshold are a prefix of them
+            jams = np.searchsorted(durations, thresholds, side='left')
+            frame = {'Threshold': thresholds, 'Machine': machine, 'Jams': jams,
+                     'Jam Seconds': np.concatenate(([0.0], np.cumsum(durations)))[jams]}
+            for bit, code in enumerate(self.shift_codes):
+                in_shift = np.concatenate(([0], np.cumsum(self.shift_masks[rows] >> bit & 1)))
+                frame[f"Jams SC:{code}"] = in_shift[jams]
+            frames.append(pd.DataFrame(frame))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    def default_durations(self, default_durations, threshold=JAM_THRESHOLD_SECONDS):
+        """
+        Returns what each default duration for last entries would give at threshold, as a
+        DataFrame with a row per default and machine: Default Seconds, Machine, Jams, Jam Seconds
+        and Last Entry Seconds (the charged non-ERROR entries that got the default).
+        """
+        values = np.asarray(default_durations, dtype=np.float64)
+        change = values - self.default_duration
+        frames = []
+        for i, machine in enumerate(self.machines):
+            rows = self.rows(machine)
+            durations, defaults = self.durations[rows], self.defaults[rows]
+            fixed = defaults == 0
+            jams = np.full(len(values), np.count_nonzero(durations[fixed] < threshold))
+            seconds = np.full(len(values), durations[fixed][durations[fixed] < threshold].sum())
+
+            # A run with k defaults is a jam while change < (threshold - duration) / k; sorting
+            # those limits makes each default's jams a prefix again
+            limits = (threshold - durations[~fixed]) / defaults[~fixed]
+            order = np.argsort(-limits, kind='stable')
+            limits, varying, counts = limits[order], durations[~fixed][order], defaults[~fixed][order]
+            added = len(limits) - np.searchsorted(limits[::-1], change, side='right')
+            jams += added
+            seconds += (np.concatenate(([0.0], np.cumsum(varying)))[added]
+                        + change * np.concatenate(([0], np.cumsum(counts)))[added])
+
+            last = np.maximum(self.last_durations[i][:, None] + change, 0).sum(axis=0)
+            frames.append(pd.DataFrame({'Default Seconds': values, 'Machine': machine, 'Jams': jams,
+                                        'Jam Seconds': seconds, 'Last Entry Seconds': last}))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def summarize_machine_entries_vectorized(updated_data, with_ledger=False, with_cube=False):
+    """
+    Same results as summarize_machine_entries_with_exclusion, computed per machine on the
+    columns of an annotated MachineEntries by summarize_machine_arrays instead of entry by entry.
+    """
+    if not isinstance(updated_data, MachineEntries):
+        updated_data = MachineEntries.from_tuples(updated_data)
+
+    summary = SummaryState(updated_data.shift_codes, by_day=with_cube)
+    summary.update(updated_data)
+    return summary.results(with_ledger, with_cube)
+
+def _summarize_machine_shard(machine_data, schedule):
+    """ Worker for summarize_machine_data_parallel: annotates and summarizes one shard of machines. """
+    summary = SummaryState(schedule.shift_codes)
+    summary.update(update_machine_data(machine_data, schedule))
+    return summary
+
+def summarize_machine_data_parallel(machine_data, schedule_dict, max_workers=None, with_ledger=False):
+    """
+    Annotates and summarizes each machine line in its own task on a process pool and merges
+    the per-machine SummaryStates, which (unlike the nested defaultdicts) pickle.
+
+    Parameters:
+    - machine_data (MachineEntries): output of parse_machine_data.
+    - schedule_dict: output of process_shift_schedule_combined_dict, or a CompiledSchedule.
+    - max_workers (int): number of worker processes; defaults to the number of CPUs. With 1
+      everything runs in this process.
+    - with_ledger (bool): also return the JamLedger.
+
+    Returns:
+    - tuple: (result, jam_count_by_shift, overall_jam_count[, ledger]), the same as summarize_machine_entries_with_exclusion.
+    """
+    schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    # Largest lines first, so a long line does not start last
+    machines = sorted(machine_data.machines, key=lambda machine: -(machine_data.rows(machine).stop - machine_data.rows(machine).start))
+    shards = [machine_data.select_machines([machine]) for machine in machines]
+
+    if max_workers == 1 or len(shards) <= 1:
+        parts = [_summarize_machine_shard(shard, schedule) for shard in shards]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parts = list(pool.map(_summarize_machine_shard, shards, [schedule] * len(shards)))
+
+    # Merge back in the original machine order
+    parts = dict(zip(machines, parts))
+    summary = SummaryState(schedule.shift_codes)
+    for machine in machine_data.machines:
+        summary.merge(parts[machine])
+    return summary.results(with_ledger)
+
+def _summarize_time_shard(machine_data, schedule, error_id):
+    """
+    Worker for summarize_machine_data_time_sharded: annotates one machine's shard and returns
+    its machine_contributions, leaving the totals to be added up in time order by the caller.
+    """
+    annotated = update_machine_data(machine_data, schedule)
+    return machine_contributions(annotated.durations, annotated.state_codes.astype(np.int64), error_id,
+                                 annotated.shift_masks, annotated.flags != 0,
+                                 len(schedule.shift_codes), len(machine_data.states))
+
+def time_shard_bounds(timestamps, state_codes, error_id, period='W'):
+    """
+    Splits one machine's entries into week ('W') or month ('M') shards, returning the row
+    index where each shard after the first starts.
+
+    A shard boundary is moved forward until neither the entry before it nor the entry at it
+    is an ERROR, so no ERROR run (with its skip flag and jam check) spans two shards. Durations
+    are already fixed by parse_machine_data, so shards need nothing else from each other.
+    """
+    if period == 'W':
+        # Weeks start on Monday; 1970-01-01 was a Thursday
+        periods = (timestamps // NS_PER_DAY + 3) // 7
+    elif period == 'M':
+        periods = timestamps.view('datetime64[ns]').astype('datetime64[M]').astype(np.int64)
+    else:
+        raise ValueError(f"Unknown shard period {period!r}, expected 'W' or 'M'.")
+
+    not_error = state_codes != error_id
+    safe = np.flatnonzero(not_error[1:] & not_error[:-1]) + 1
+    nominal = np.flatnonzero(periods[1:] != periods[:-1]) + 1
+    snapped = np.searchsorted(safe, nominal)
+    return np.unique(safe[snapped[snapped < len(safe)]])
+
+def summarize_machine_data_time_sharded(machine_data, schedule_dict, period='W', max_workers=None, with_ledger=False):
+    """
+    Annotates and summarizes every machine in week or month shards on a process pool, for
+    sites with few lines but long histories (see time_shard_bounds for how shards are cut).
+
+    Workers return per-entry contributions instead of totals; adding them up here in time
+    order keeps every total bit for bit equal to the serial summarizer. max_workers and
+    with_ledger are as for summarize_machine_data_parallel.
+
+    Returns:
+    - tuple: (result, jam_count_by_shift, overall_jam_count[, ledger]), the same as summarize_machine_entries_with_exclusion.
+    """
+    schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+    max_workers = max_workers or os.cpu_count() or 1
+    error_id = machine_data.states.index("ERROR") if "ERROR" in machine_data.states else -1
+
+    shards = []
+    for machine in machine_data.machines:
+        rows = machine_data.rows(machine)
+        bounds = time_shard_bounds(machine_data.timestamps[rows], machine_data.state_codes[rows], error_id, period)
+        edges = np.concatenate(([0], bounds, [rows.stop - rows.start])) + rows.start
+        for start, stop in zip(edges[:-1], edges[1:]):
+            shards.append((machine, MachineEntries([machine], [0, stop - start], machine_data.timestamps[start:stop],
+                                                   machine_data.state_codes[start:stop], machine_data.states,
+                                                   machine_data.durations[start:stop])))
+
+    tasks = ([shard for machine, shard in shards], [schedule] * len(shards), [error_id] * len(shards))
+    if max_workers == 1 or len(shards) <= 1:
+        parts = list(map(_summarize_time_shard, *tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parts = list(pool.map(_summarize_time_shard, *tasks))
+
+    summary = SummaryState(schedule.shift_codes)
+    summary.states = list(machine_data.states)
+    for machine in machine_data.machines:
+        summary.machines[machine] = MachineSummary(len(schedule.shift_codes), len(summary.states))
+    for (machine, shard), (keys, weights, _, jams_by_shift, jams, jam_events) in zip(shards, parts):
+        machine_summary = summary.machines[machine]
+        np.add.at(machine_summary.totals.reshape(-1), keys, weights)
+        np.add.at(machine_summary.counts.reshape(-1), keys, 1)
+        machine_summary.jams_by_shift += jams_by_shift
+        machine_summary.jams += jams
+        machine_summary.add_jam_events(shard.timestamps, shard.durations, jam_events)
+    return summary.results(with_ledger)
+
+def parse_time(entry):
+    """
+    Parses a time entry in the format 'Day Hour:Minute' into a tuple of (day, time).
+
+    Parameters:
+    - entry (str): The time entry to parse.
+
+    Returns:
+    - tuple: A tuple containing the day and time parsed from the entry.
+    """
+    # Check if the entry is NaN or 'n/a', and return None for both day and time if true
+    if pd.isna(entry) or entry.strip().lower() == "n/a":
+        return (None, None)
+    
+    # Split the entry into day and time components
+    day, t = entry.split()
+    
+    # Split the time component into hour and minute components and convert them to integers
+    hour, minute = map(int, t.split(':'))
+    
+    # Return a tuple containing the day and a time object constructed from the hour and minute
+    return (day, time(hour, minute))
+
+def process_shift_schedule_combined_dict(file_path):
+    """ Process a CSV file of shift data into a structured dictionary format. """
+    shift_data = pd.read_csv(file_path)
+    
+    schedule_dict = {}
+    
+    for _, row in shift_data.iterrows():
+        shift_code = row['Shift Code']
+        shift_start = row['Shift Start Time']
+        shift_end = row['Shift End Time']
+        
+        # Parse times for the shift start and end
+        start_day, start_time = parse_time(shift_start)
+        end_day, end_time = parse_time(shift_end)
+        
+        # Key for breaks
+        break_key = f"{shift_code} breaks"
+        
+        # Store the shift times as a tuple in the list under the shift code
+        if shift_code not in schedule_dict:
+            schedule_dict[shift_code] = []
+        schedule_dict[shift_code].append((start_day, start_time, end_day, end_time))
+        
+        # Initialize breaks list if not present
+        if break_key not in schedule_dict:
+            schedule_dict[break_key] = []
+        
+        # Processing breaks - assuming break times are in pairs in columns labeled 'Break 1 Start', 'Break 1 End', etc.
+        break_columns = [col for col in shift_data.columns if 'Break' in col or 'Lunch' in col]
+        for i in range(0, len(break_columns), 2):  # Iterate in steps of 2 to get start and end together
+            if i + 1 < len(break_columns):  # Check if there is a pair
+                break_start = row[break_columns[i]]
+                break_end = row[break_columns[i + 1]]
+                
+                if pd.notna(break_start) and pd.notna(break_end):
+                    break_start_day, break_start_time = parse_time(break_start)
+                    break_end_day, break_end_time = parse_time(break_end)
+                    
+                    # Append the break times as a tuple
+                    schedule_dict[break_key].append(
+                        (break_start_day, break_start_time, break_end_day, break_end_time)
+                    )
+    
+    return schedule_dict
+
+# Annotation flags stored per entry in MachineEntries.flags
+FLAG_BREAK = 1
+FLAG_SHIFTCROSSOVER = 2
+
+WEEKDAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Binary event store (see MachineEntries.write_events): a fixed prelude of magic, version,
+# JSON header length, record count and machine count, then the JSON header padded to 8 bytes,
+# the per-machine offset index (int64, machines + 1) and the fixed-width records
+EVENT_STORE_MAGIC = b"JTEVENTS"
+EVENT_STORE_VERSION = 1
+EVENT_STORE_PRELUDE = struct.Struct("<8sIIQQ")
+EVENT_RECORD_DTYPE = np.dtype([('timestamp', '<i8'), ('duration', '<f8'), ('machine', '<u2'), ('state', '<i2'),
+                               ('reserved', '<u4')])
+
+class MachineEntries:
+    """
+    Column-wise store of the entries of every machine, passed between the pipeline stages.
+
+    Rows are grouped by machine (machines[i] owns rows offsets[i]:offsets[i + 1]) and are in
+    time order within a machine. Columns:
+    - timestamps (int64): wall-clock nanoseconds since the epoch
+    - state_codes (int16): index into states
+    - weekdays (int8): 0 for Monday ... 6 for Sunday, computed from timestamps on first use
+    - durations (float64): seconds until the machine's next entry
+    - shift_masks (int64): bit i set when the entry falls in shift_codes[i]
+    - flags (int8): FLAG_BREAK and/or FLAG_SHIFTCROSSOVER
+
+    shift_masks and flags stay zero (and shift_codes empty) until update_machine_data annotates the entries.
+    """
+
+    def __init__(self, machines, offsets, timestamps, state_codes, states, durations,
+                 shift_masks=None, flags=None, shift_codes=None):
+        self.machines = list(machines)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.int64)
+        self.state_codes = np.asarray(state_codes, dtype=np.int16)
+        self.states = list(states)
+        self.durations = np.asarray(durations, dtype=np.float64)
+        self.shift_masks = np.zeros(len(self.timestamps), dtype=np.int64) if shift_masks is None else shift_masks
+        self.flags = np.zeros(len(self.timestamps), dtype=np.int8) if flags is None else flags
+        self.shift_codes = list(shift_codes or [])
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @functools.cached_property
+    def weekdays(self):
+        """ The weekday column, computed on first use so mapped stores are not read just to fill it. """
+        weekdays = self.timestamps // NS_PER_DAY
+        weekdays += 3  # 1970-01-01 was a Thursday
+        weekdays %= 7
+        return weekdays.astype(np.int8)
+
+    def rows(self, machine):
+        """ Returns the slice of rows belonging to a machine. """
+        i = self.machines.index(machine)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def with_annotations(self, shift_masks, flags, shift_codes):
+        """ Returns a copy sharing the entry columns, with the given annotation columns. """
+        annotated = MachineEntries(self.machines, self.offsets, self.timestamps, self.state_codes, self.states,
+                                   self.durations, shift_masks, flags, shift_codes)
+        if 'weekdays' in self.__dict__:
+            annotated.weekdays = self.weekdays
+        return annotated
+
+    def take(self, mask):
+        """ Returns the rows where mask is True, still grouped by machine. """
+        kept = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+        return MachineEntries(self.machines, kept[self.offsets], self.timestamps[mask], self.state_codes[mask],
+                              self.states, self.durations[mask], self.shift_masks[mask], self.flags[mask],
+                              self.shift_codes)
+
+    def select_machines(self, machines):
+        """ Returns the rows of the given machines, in that order. """
+        rows = [self.rows(machine) for machine in machines]
+        index = np.concatenate([np.arange(r.start, r.stop) for r in rows] or [np.zeros(0, dtype=np.int64)])
+        offsets = np.concatenate(([0], np.cumsum([r.stop - r.start for r in rows], dtype=np.int64)))
+        return MachineEntries(machines, offsets, self.timestamps[index], self.state_codes[index], self.states,
+                              self.durations[index], self.shift_masks[index], self.flags[index], self.shift_codes)
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Builds the store from {machine: (timestamps_ns, states, durations)}, one machine at a time.
+        """
+        machines = list(columns)
+        lengths = [len(columns[machine][0]) for machine in machines]
+        offsets = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)))
+        if machines:
+            timestamps = np.concatenate([columns[machine][0] for machine in machines])
+            raw_states = np.concatenate([np.asarray(columns[machine][1], dtype=object) for machine in machines])
+            durations = np.concatenate([columns[machine][2] for machine in machines])
+        else:
+            timestamps, raw_states, durations = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=object), np.zeros(0)
+        state_codes, states = pd.factorize(raw_states)
+        return cls(machines, offsets, timestamps, state_codes, states, durations)
+
+    @classmethod
+    def from_wide(cls, data, default_duration=DEFAULT_DURATION_SECONDS, gaps=()):
+        """
+        Melts the wide machine frame (a datetime 'Time' column plus one categorical state column
+        per machine) into the store in one pass, without a per-machine copy of the frame.
+
+        Rows with no time or no state are dropped. Entries are ordered by (machine, time), and
+        durations come from one diff over the long timestamps, with each machine's last entry
+        getting default_duration seconds. States are numbered in the order they first appear,
+        machine by machine, the same as from_columns.
+
+        gaps lists (end, start) nanosecond timestamps of holes in the data, such as a missing
+        export file; an entry at or before end followed by one at or after start is treated
+        like a last entry instead of running across the hole.
+        """
+        machines = [machine for machine in sorted(data.columns) if machine != 'Time' and machine != 'Weekday']
+        times = to_epoch_ns(data['Time'])
+        has_time = data['Time'].notna().to_numpy()
+
+        # Each machine's rows with both a time and a state, to size the long columns up front
+        categoricals = [data[machine] if isinstance(data[machine].dtype, pd.CategoricalDtype)
+                        else data[machine].astype('category') for machine in machines]
+        counts = [np.count_nonzero((column.cat.codes.to_numpy() >= 0) & has_time) for column in categoricals]
+        offsets = np.concatenate(([0], np.cumsum(counts, dtype=np.int64)))
+        timestamps = np.empty(offsets[-1], dtype=np.int64)
+        state_codes = np.empty(offsets[-1], dtype=np.int16)
+
+        # Fill them machine by machine, mapping state codes onto the states seen so far
+        states, state_index = [], {}
+        for i, column in enumerate(categoricals):
+            column_codes = column.cat.codes.to_numpy()
+            rows = np.flatnonzero((column_codes >= 0) & has_time)
+            column_codes = column_codes[rows]
+            seen, first = np.unique(column_codes, return_index=True)
+            state_map = np.zeros(len(column.cat.categories), dtype=np.int16)
+            for code in seen[np.argsort(first)]:
+                state = column.cat.categories[code]
+                if state not in state_index:
+                    state_index[state] = len(states)
+                    states.append(state)
+                state_map[code] = state_index[state]
+            timestamps[offsets[i]:offsets[i + 1]] = times[rows]
+            state_codes[offsets[i]:offsets[i + 1]] = state_map[column_codes]
+
+        # Sort by time within each machine, if the file was not already in time order
+        steps = np.diff(timestamps)
+        backwards = steps < 0
+        boundaries = offsets[1:-1]
+        backwards[boundaries[(boundaries > 0) & (boundaries < len(timestamps))] - 1] = False
+        if backwards.any():
+            machine_ids = np.repeat(np.arange(len(machines)), np.diff(offsets))
+            order = np.lexsort((timestamps, machine_ids))
+            timestamps, state_codes = timestamps[order], state_codes[order]
+            steps = np.diff(timestamps)
+        del backwards
+
+        durations = np.empty(len(timestamps), dtype=np.float64)
+        np.divide(steps, 1e9, out=durations[:-1])
+        del steps
+        durations[offsets[1:][offsets[1:] > offsets[:-1]] - 1] = default_duration
+        for end, start in gaps:
+            durations[:-1][(timestamps[:-1] <= end) & (timestamps[1:] >= start)] = default_duration
+        return cls(machines, offsets, timestamps, state_codes, states, durations)
+
+    @classmethod
+    def from_tuples(cls, machine_data):
+        """ Builds the store from the older dict of (timestamp, state, weekday, duration, *codes) tuples. """
+        columns = {}
+        codes_by_machine = {}
+        for machine, entries in machine_data.items():
+            timestamps = to_epoch_ns([entry[0] for entry in entries])
+            columns[machine] = (timestamps, [entry[1] for entry in entries],
+                                np.array([entry[3] for entry in entries], dtype=np.float64))
+            codes_by_machine[machine] = [entry[4:] for entry in entries]
+        entries = cls.from_columns(columns)
+
+        if any(codes for machine_codes in codes_by_machine.values() for codes in machine_codes):
+            shift_codes = []
+            shift_masks = np.zeros(len(entries), dtype=np.int64)
+            flags = np.zeros(len(entries), dtype=np.int8)
+            row = 0
+            for machine in entries.machines:
+                for codes in codes_by_machine[machine]:
+                    for code in codes:
+                        if code.startswith("SC:"):
+                            if code[len("SC:"):] not in shift_codes:
+                                shift_codes.append(code[len("SC:"):])
+                            shift_masks[row] |= 1 << shift_codes.index(code[len("SC:"):])
+                    if 'break' in codes:
+                        flags[row] |= FLAG_BREAK
+                    if 'shiftcrossover' in codes:
+                        flags[row] |= FLAG_SHIFTCROSSOVER
+                    row += 1
+            entries = entries.with_annotations(shift_masks, flags, shift_codes)
+        return entries
+
+    def write_events(self, file_path, metadata=None):
+        """
+        Writes the entries to a binary event store: one fixed-width EVENT_RECORD_DTYPE record
+        (timestamp, duration, machine id, state code) per entry, in machine then time order,
+        behind a small header and a per-machine offset index. Annotations are not stored.
+        The file is written under a temporary name and moved into place, so readers never see half of it.
+        """
+        if len(self.machines) > np.iinfo(np.uint16).max:
+            raise ValueError("Event stores hold at most 65535 machines.")
+        header = json.dumps({'machines': self.machines, 'states': self.states, 'metadata': metadata or {}},
+                            default=str).encode()
+        header += b" " * (-(EVENT_STORE_PRELUDE.size + len(header)) % 8)
+
+        records = np.zeros(len(self), dtype=EVENT_RECORD_DTYPE)
+        records['timestamp'] = self.timestamps
+        records['duration'] = self.durations
+        records['machine'] = np.repeat(np.arange(len(self.machines), dtype=np.uint16), np.diff(self.offsets))
+        records['state'] = self.state_codes
+
+        temp_path = f"{file_path}.tmp"
+        with open(temp_path, 'wb') as file:
+            file.write(EVENT_STORE_PRELUDE.pack(EVENT_STORE_MAGIC, EVENT_STORE_VERSION, len(header),
+                                                len(records), len(self.machines)))
+            file.write(header)
+            file.write(self.offsets.astype('<i8').tobytes())
+            file.write(memoryview(records).cast('B'))
+        os.replace(temp_path, file_path)
+
+    @classmethod
+    def map_events(cls, file_path):
+        """
+        Opens a file written by write_events() without reading it: the timestamp, duration and
+        state columns are read-only views into the memory-mapped records, so pages are only read
+        when a stage touches them. Returns (MachineEntries, metadata).
+        """
+        with open(file_path, 'rb') as file:
+            prelude = file.read(EVENT_STORE_PRELUDE.size)
+            if len(prelude) < EVENT_STORE_PRELUDE.size:
+                raise ValueError(f"{file_path} is not an event store.")
+            magic, version, header_size, n_records, n_machines = EVENT_STORE_PRELUDE.unpack(prelude)
+            if magic != EVENT_STORE_MAGIC or version != EVENT_STORE_VERSION:
+                raise ValueError(f"{file_path} is not a version {EVENT_STORE_VERSION} event store.")
+            index_start = EVENT_STORE_PRELUDE.size + header_size
+            records_start = index_start + 8 * (n_machines + 1)
+            if os.fstat(file.fileno()).st_size != records_start + n_records * EVENT_RECORD_DTYPE.itemsize:
+                raise ValueError(f"{file_path} is truncated.")
+            header = json.loads(file.read(header_size))
+            # An empty file cannot be mapped, but an empty store is never empty: it has the prelude
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # The arrays keep the mapping alive; it is unmapped once they are all gone
+        offsets = np.frombuffer(mapped, dtype='<i8', count=n_machines + 1, offset=index_start)
+        records = np.frombuffer(mapped, dtype=EVENT_RECORD_DTYPE, count=n_records, offset=records_start)
+        entries = cls(header['machines'], offsets, records['timestamp'], records['state'], header['states'],
+                      records['duration'])
+        return entries, header['metadata']
+
+    def to_tuples(self):
+        """
+        Returns the older dict of (timestamp, state, weekday, duration, *codes) tuples per machine.
+        Codes are listed in shift_codes order, followed by 'break' or 'shiftcrossover'.
+        """
+        annotated = bool(self.shift_codes) or bool(self.flags.any())
+        machine_data = {}
+        for machine in self.machines:
+            rows = self.rows(machine)
+            entries = []
+            for ts, state, weekday, duration, mask, flags in zip(
+                    pd.to_datetime(self.timestamps[rows]), self.state_codes[rows], self.weekdays[rows],
+                    self.durations[rows], self.shift_masks[rows].tolist(), self.flags[rows]):
+                entry = (ts, self.states[state], WEEKDAY_NAMES[weekday], float(duration))
+                if annotated:
+                    entry += tuple(f"SC:{code}" for bit, code in enumerate(self.shift_codes) if mask >> bit & 1)
+                    if flags & FLAG_BREAK:
+                        entry += ("break",)
+                    if flags & FLAG_SHIFTCROSSOVER:
+                        entry += ("shiftcrossover",)
+                entries.append(entry)
+            machine_data[machine] = entries
+        return machine_data
+
+def to_epoch_ns(timestamps):
+    """ Converts timestamps into int64 wall-clock nanoseconds since the epoch. """
+    times = pd.DatetimeIndex(timestamps)
+    if times.tz is not None:
+        # Shifts are wall-clock times, so drop the zone but keep the local time
+        times = times.tz_localize(None)
+    return times.values.astype('datetime64[ns]').view('int64')
+
+# Formats tried on the Time column before falling back to pandas' own guess
+TIME_FORMATS = ["%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M",
+                "%m/%d/%Y %H:%M:%S", "%m/%d/%Y %H:%M", "%m/%d/%Y %I:%M:%S %p", "%m/%d/%Y %I:%M %p"]
+
+def detect_time_format(values, sample_size=1000):
+    """
+    Returns a strftime format that parses an evenly spread sample of the non-empty values,
+    or None if no single format does (mixed or unusual layouts).
+    """
+    values = pd.Series(values).dropna()
+    if values.empty:
+        return None
+    sample = values.iloc[np.linspace(0, len(values) - 1, min(sample_size, len(values))).astype(np.int64)]
+    guessed = pd.tseries.api.guess_datetime_format(str(sample.iloc[0]))
+    for time_format in ([guessed] if guessed else []) + TIME_FORMATS:
+        try:
+            pd.to_datetime(sample, format=time_format)
+            return time_format
+        except (ValueError, TypeError):
+            continue
+    return None
+
+def parse_time_column(column, time_format=None):
+    """
+    Converts the Time column to datetimes with one explicit format, detected from a sample
+    when not given, instead of letting pandas work it out value by value. Falls back to
+    pd.to_datetime's own parsing when the format does not fit every value. Columns that are
+    already datetimes (as the pyarrow engine reads them) are returned as they are.
+
+    Returns:
+    - tuple: (datetime Series, format used or None)
+    """
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column, time_format
+    time_format = time_format or detect_time_format(column)
+    if time_format:
+        try:
+            return pd.to_datetime(column, format=time_format), time_format
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(column), None
+
+def default_csv_engine():
+    """ 'pyarrow' when pyarrow is installed (it is much faster at reading and parsing times), else 'c'. """
+    return 'pyarrow' if importlib.util.find_spec('pyarrow') else 'c'
+
+def machine_csv_options(columns):
+    """
+    Returns the read_csv options for a machine CSV with the given header columns: only Time
+    and the machine columns (leaving out Weekday), with the states as categoricals.
+    """
+    machines = [column for column in columns if column != 'Time' and column != 'Weekday']
+    return {'usecols': ['Time'] + machines, 'dtype': {machine: 'category' for machine in machines}}
+
+def header_columns(header):
+    """ Returns the column names in the raw header line of a machine CSV. """
+    return next(csv.reader([header.decode('utf-8-sig').rstrip('\r\n')]), [])
+
+def read_machine_csv(file_path, engine=None, time_format=None):
+    """
+    Reads only the Time and machine columns of a machine CSV (leaving out Weekday), with
+    the states as categoricals and Time parsed by parse_time_column.
+
+    engine is a pandas read_csv engine, by default default_csv_engine(). If the pyarrow engine
+    cannot read the file, it is read again with the C engine. time_format skips detecting the
+    format of the Time column.
+    """
+    with open(file_path, newline='', encoding='utf-8-sig') as file:
+        options = machine_csv_options(next(csv.reader(file), []))
+    engine = engine or default_csv_engine()
+    try:
+        data = pd.read_csv(file_path, engine=engine, **options)
+    except Exception:
+        if engine == 'c':
+            raise
+        data = pd.read_csv(file_path, engine='c', **options)
+    data['Time'], _ = parse_time_column(data['Time'], time_format)
+    return data
+
+def parse_machine_data(file_path, engine=None):
+    """
+    Reads the machine CSV (a 'Time' column plus one state column per machine) into a
+    MachineEntries, with each entry's duration running until the machine's next entry.
+
+    Returns:
+    - tuple: (MachineEntries, (first timestamp, last timestamp))
+    """
+    # Only the needed columns, states as categoricals, Time parsed with one detected format
+    data = read_machine_csv(file_path, engine)
+    
+    # Determine the first and last datetime for the dataset
+    datetime_range = (data['Time'].min(), data['Time'].max())
+
+    # Melt into one long table of entries, durations running to the machine's next entry
+    return MachineEntries.from_wide(data), datetime_range
+       
+# A later file starting more than this after the earlier files end leaves a gap in the data
+FILE_GAP_SECONDS = 3600
+
+def expand_machine_files(path):
+    """ Returns the machine CSVs a path names: the file itself, the *.csv files of a folder, or a glob's matches, sorted. """
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith('.csv'))
+    if glob.has_magic(path):
+        return sorted(glob.glob(path))
+    return [path]
+
+def merge_machine_frames(frames, gap_seconds=FILE_GAP_SECONDS):
+    """
+    Merges wide machine frames read from separate files (each in time order) into one, in time order.
+
+    Files are taken in order of their first timestamp; where they overlap, rows of a later file
+    that repeat a row of an earlier one (same time and states) are dropped, and the rest are
+    merged by a stable sort on Time. Machines missing from a file are empty there. The work is
+    done on int64 times and int16 state codes rather than per-file DataFrames.
+
+    Returns:
+    - tuple: (merged DataFrame, gaps), gaps being the (end, start) nanosecond timestamps of
+      holes longer than gap_seconds between files, for MachineEntries.from_wide.
+    """
+    frames = [frame for frame in frames if frame['Time'].notna().any()]
+    machines = sorted({column for frame in frames for column in frame.columns if column != 'Time'})
+    states, state_index = [], {}
+
+    # Each file as (times, state codes per machine), NaT times and empty cells kept as they are
+    parts = []
+    for frame in frames:
+        times = to_epoch_ns(frame['Time'])
+        codes = np.full((len(frame), len(machines)), -1, dtype=np.int16)
+        for i, machine in enumerate(machines):
+            if machine not in frame.columns:
+                continue
+            column = frame[machine]
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                column = column.astype('category')
+            for state in column.cat.categories:
+                if state not in state_index:
+                    state_index[state] = len(states)
+                    states.append(state)
+            state_map = np.array([state_index[state] for state in column.cat.categories] + [-1], dtype=np.int16)
+            codes[:, i] = state_map[column.cat.codes.to_numpy()]
+        valid = times[frame['Time'].notna().to_numpy()]
+        parts.append((int(valid.min()), int(valid.max()), times, codes))
+    parts.sort(key=lambda part: part[0])
+
+    kept, gaps, end = [], [], None
+    for first, last, times, codes in parts:
+        if end is not None and first <= end:
+            # Drop rows repeating an earlier file's row in the overlap
+            earlier = [np.column_stack((t, c))[t >= first] for f, l, t, c in kept if l >= first]
+            seen = set(map(bytes, np.concatenate(earlier)))
+            overlap = np.flatnonzero(times <= end)
+            rows = np.column_stack((times[overlap], codes[overlap]))
+            repeated = overlap[[bytes(row) in seen for row in rows]]
+            times, codes = np.delete(times, repeated), np.delete(codes, repeated, axis=0)
+        elif end is not None and first - end > gap_seconds * 10**9:
+            gaps.append((end, first))
+        kept.append((first, last, times, codes))
+        end = max(end, last) if end is not None else last
+
+    times = np.concatenate([part[2] for part in kept]) if kept else np.zeros(0, dtype=np.int64)
+    codes = np.concatenate([part[3] for part in kept]) if kept else np.zeros((0, len(machines)), dtype=np.int16)
+    if np.any(np.diff(times) < 0):
+        order = np.argsort(times, kind='stable')
+        times, codes = times[order], codes[order]
+
+    data = pd.DataFrame({'Time': times.view('datetime64[ns]')})
+    for i, machine in enumerate(machines):
+        data[machine] = pd.Categorical.from_codes(codes[:, i], categories=states)
+    return data, gaps
+
+def parse_machine_files(file_paths, max_workers=None, engine=None, progress=None):
+    """
+    Reads several machine CSVs (say one per day or week) on a thread pool and parses them as
+    one, merged by merge_machine_frames. Durations run across file boundaries, except over
+    gaps between files, where entries get the default duration as at the end of the data.
+
+    progress, if given, is called as progress("Reading", files_done, files_total).
+
+    Returns:
+    - tuple: (MachineEntries, (first timestamp, last timestamp)), the same as parse_machine_data.
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        raise ValueError("No machine CSV files were given.")
+    report = progress or (lambda stage, done, total: None)
+
+    # Exports from one source share their timestamp layout, so detect it once
+    time_format = detect_time_format(pd.read_csv(file_paths[0], usecols=['Time'], nrows=1000)['Time'])
+    frames = []
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(file_paths))) as pool:
+        for frame in pool.map(lambda file_path: read_machine_csv(file_path, engine, time_format), file_paths):
+            frames.append(frame)
+            report("Reading", len(frames), len(file_paths))
+
+    data, gaps = merge_machine_frames(frames)
+    datetime_range = (data['Time'].min(), data['Time'].max())
+    return MachineEntries.from_wide(data, gaps=gaps), datetime_range
+
+# Bump when the cached MachineEntries layout changes, so old cache files are ignored
+MACHINE_CACHE_VERSION = 2
+
+def default_cache_dir():
+    """ Folder holding cached parses of machine CSVs. """
+    return os.path.join(os.path.expanduser("~"), ".jammer_time", "cache")
+
+def file_fingerprint(file_path):
+    """ Returns 'content hash:size:mtime' identifying the current contents of a file. """
+    stat = os.stat(file_path)
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return f"{digest.hexdigest()}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def parse_machine_data_cached(file_path, cache_dir=None):
+    """
+    parse_machine_data, with the result cached on disk as a binary event store
+    (MachineEntries.write_events) that later calls memory-map instead of reading.
+
+    The cache file is named after the CSV's path and records the CSV's fingerprint (content
+    hash, size and mtime); when the CSV changes the fingerprint no longer matches and the
+    CSV is parsed again, replacing the cache file. A cache that cannot be read or written
+    only costs the re-parse.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    source = os.path.abspath(file_path)
+    cache_path = os.path.join(cache_dir, hashlib.blake2b(source.encode(), digest_size=16).hexdigest() + ".events")
+    fingerprint = f"v{MACHINE_CACHE_VERSION}:{file_fingerprint(file_path)}"
+
+    if os.path.exists(cache_path):
+        try:
+            machine_data, metadata = MachineEntries.map_events(cache_path)
+            if metadata.get('fingerprint') == fingerprint:
+                return machine_data, (pd.Timestamp(metadata['start']), pd.Timestamp(metadata['end']))
+            # Unmap the stale store, which Windows will not replace while it is mapped
+            del machine_data
+        except (OSError, ValueError, KeyError):
+            pass
+
+    machine_data, datetime_range = parse_machine_data(file_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        machine_data.write_events(cache_path, {'fingerprint': fingerprint, 'source': source,
+                                               'start': datetime_range[0].isoformat(), 'end': datetime_range[1].isoformat()})
+    except OSError:
+        pass
+    return machine_data, datetime_range
+
+# Bytes read per block when streaming a machine CSV line by line
+STREAM_BLOCK_BYTES = 2 << 20
+
+def iter_line_blocks(file, block_bytes=None, partial=False):
+    """
+    Reads a binary file from its current position in blocks of whole lines, about block_bytes
+    (default STREAM_BLOCK_BYTES) each. A last line without its newline (one still being written)
+    is only yielded, as a final block of its own, with partial=True.
+    """
+    block_bytes = block_bytes or STREAM_BLOCK_BYTES
+    rest = b''
+    while True:
+        block = file.read(block_bytes)
+        if not block:
+            break
+        block = rest + block
+        end = block.rfind(b'\n') + 1
+        rest = block[end:]
+        if end:
+            yield block[:end]
+    if partial and rest:
+        yield rest
+
+def read_machine_block(header, block, options, engine=None):
+    """
+    Reads a block of whole lines of a machine CSV (see iter_line_blocks) behind its header
+    line, with the read_csv options from machine_csv_options. engine works as in read_machine_csv.
+    """
+    engine = engine or default_csv_engine()
+    try:
+        return pd.read_csv(io.BytesIO(header + block), engine=engine, **options)
+    except Exception:
+        if engine == 'c':
+            raise
+        return pd.read_csv(io.BytesIO(header + block), engine='c', **options)
+
+def line_starts(block):
+    """ Returns the byte offset of each line of block that read_csv reads as a row (blank lines are skipped). """
+    raw = np.frombuffer(block + b'\n', dtype=np.uint8)
+    line_breaks = np.flatnonzero(raw == ord('\n'))
+    starts = np.concatenate(([0], line_breaks[:-1] + 1))
+    lengths = line_breaks - starts
+    lengths -= (lengths > 0) & (raw[np.maximum(line_breaks - 1, 0)] == ord('\r'))
+    return starts[lengths > 0]
+
+class MachineChunkReader:
+    """
+    Turns consecutive chunks of the machine CSV (DataFrames with the raw 'Time' column, ideally
+    read with machine_csv_options) into MachineEntries, melted by MachineEntries.from_wide.
+
+    Each machine's last entry is held back until a later chunk supplies the timestamp its duration
+    runs to; finish() releases them with the same DEFAULT_DURATION_SECONDS as parse_machine_data.
+    The reader only holds plain values, so it can be pickled and resumed later.
+    """
+
+    def __init__(self):
+        self.machines = None
+        self.held = {}  # machine -> (timestamp_ns, state) of the entry still waiting for its duration
+        self.datetime_range = (None, None)
+        self.time_format = None  # detected from the first chunk, see parse_time_column
+
+    def feed(self, chunk):
+        """ Returns the entries of the chunk (and earlier held entries) whose duration is now known. """
+        if self.machines is None:
+            self.machines = [machine for machine in sorted(chunk.columns) if machine != 'Time' and machine != 'Weekday']
+        times, self.time_format = parse_time_column(chunk['Time'], self.time_format)
+        chunk = chunk.assign(Time=times)
+        if chunk['Time'].notna().any():
+            first, last = self.datetime_range
+            first = chunk['Time'].min() if first is None else min(first, chunk['Time'].min())
+            last = chunk['Time'].max() if last is None else max(last, chunk['Time'].max())
+            self.datetime_range = (first, last)
+
+        # Melt the chunk as parse_machine_data does, then put each machine's held entry in front of its rows
+        entries = MachineEntries.from_wide(chunk)
+        states = list(entries.states)
+        held = [self.held.get(machine) for machine in entries.machines]
+        for entry in held:
+            if entry is not None and entry[1] not in states:
+                states.append(entry[1])
+        has_held = np.array([entry is not None for entry in held], dtype=bool)
+        positions = entries.offsets[:-1][has_held]
+        timestamps = np.insert(entries.timestamps, positions,
+                               np.array([entry[0] for entry in held if entry is not None], dtype=np.int64))
+        state_codes = np.insert(entries.state_codes, positions,
+                                np.array([states.index(entry[1]) for entry in held if entry is not None], dtype=np.int16))
+        counts = np.diff(entries.offsets) + has_held
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        # Each machine's newest entry waits for the next chunk to give its duration
+        last = offsets[1:][counts > 0] - 1
+        for i, row in zip(np.flatnonzero(counts > 0), last):
+            self.held[entries.machines[i]] = (int(timestamps[row]), states[state_codes[row]])
+        durations = np.empty(len(timestamps))
+        np.divide(np.diff(timestamps), 1e9, out=durations[:-1])
+        keep = np.ones(len(timestamps), dtype=bool)
+        keep[last] = False
+        kept_offsets = np.concatenate(([0], np.cumsum(np.maximum(counts - 1, 0))))
+        return MachineEntries(entries.machines, kept_offsets, timestamps[keep], state_codes[keep], states,
+                              durations[keep])
+
+    def finish(self):
+        """ Returns the held entries, each running for DEFAULT_DURATION_SECONDS. """
+        columns = {machine: (np.array([self.held[machine][0]]), np.array([self.held[machine][1]], dtype=object),
+                             np.array([float(DEFAULT_DURATION_SECONDS)]))
+                   for machine in (self.machines or []) if machine in self.held}
+        self.held = {}
+        return MachineEntries.from_columns(columns)
+
+def iter_machine_data_chunks(file_path, block_bytes=None):
+    """
+    Streams the machine CSV in blocks of about block_bytes (default STREAM_BLOCK_BYTES) of whole
+    lines, so memory use does not depend on the file size.
+
+    Yields (MachineEntries, datetime_range) per chunk, datetime_range covering the rows read so far.
+    The last item holds each machine's final entry (see MachineChunkReader).
+    """
+    reader = MachineChunkReader()
+    with open(file_path, 'rb') as file:
+        header = file.readline()
+        options = machine_csv_options(header_columns(header))
+        for block in iter_line_blocks(file, block_bytes, partial=True):
+            yield reader.feed(read_machine_block(header, block, options)), reader.datetime_range
+    yield reader.finish(), reader.datetime_range
+
+def summarize_machine_data_streaming(file_path, schedule_dict, block_bytes=None, with_ledger=False,
+                                     with_cube=False, split=False, compact=False, stats=None):
+    """
+    Runs annotation and jam detection over the machine CSV one chunk at a time, so only one
+    chunk of rows is in memory besides the totals. split and compact are passed to
+    prepare_machine_entries for each chunk. stats, if given, is a dict that gets
+    'subsecond_entries' (see count_subsecond_entries) added up over the chunks.
+
+    Returns:
+    - tuple: ((result, jam_count_by_shift, overall_jam_count), datetime_range), the same
+      as summarizing the output of parse_machine_data in one go. with_ledger=True adds the
+      JamLedger to the results and with_cube=True the SummaryCube.
+    """
+    schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+    summary = SummaryState(schedule.shift_codes, by_day=with_cube)
+    datetime_range = (None, None)
+    for entries, datetime_range in iter_machine_data_chunks(file_path, block_bytes):
+        if stats is not None:
+            stats['subsecond_entries'] = stats.get('subsecond_entries', 0) + count_subsecond_entries(entries)
+        entries = prepare_machine_entries(entries, schedule, split, compact)
+        if len(entries):
+            summary.update(update_machine_data(entries, schedule))
+    return summary.results(with_ledger, with_cube), datetime_range
+
+# Bump when the stored IncrementalSummary layout changes
+INCREMENTAL_VERSION = 6
+
+class IncrementalSummary:
+    """
+    What summarize_machine_data_incremental keeps on disk for one machine CSV, schedule and choice of split and compact.
+
+    Attributes:
+    - header (bytes): the CSV's header line.
+    - offset (int): byte offset of the first line not yet summarized (the start of the last day seen).
+    - prefix_digest (str): blake2b of the bytes before offset, to detect files that were rewritten.
+    - reader (MachineChunkReader): reader state at offset, with each machine's entry waiting for its duration.
+    - summary (SummaryState): all complete days, kept by day, including the pending ERROR runs and skip flags.
+    """
+
+    def __init__(self, header):
+        self.version = INCREMENTAL_VERSION
+        self.header = header
+        self.offset = len(header)
+        self.prefix_digest = None
+        self.reader = MachineChunkReader()
+        self.summary = None
+
+def _read_incremental_summary(store_path, file_path):
+    """ Loads the stored summary and checks the CSV still starts with what it summarized. Returns (store, digest) or None. """
+    try:
+        with open(store_path, 'rb') as file:
+            store = pickle.load(file)
+        if store.version != INCREMENTAL_VERSION or os.path.getsize(file_path) < store.offset:
+            return None
+        digest = hashlib.blake2b(digest_size=20)
+        with open(file_path, 'rb') as file:
+            remaining = store.offset
+            while remaining:
+                block = file.read(min(remaining, 1 << 20))
+                if not block:
+                    return None
+                digest.update(block)
+                remaining -= len(block)
+        if digest.hexdigest() != store.prefix_digest:
+            return None
+        return store, digest
+    except (OSError, pickle.UnpicklingError, AttributeError, EOFError, ValueError):
+        return None
+
+class StageProfile:
+    """
+    Wall time, CPU time, rows and peak memory of each stage of a calculation.
+
+    Wrap each stage in `with profile.stage(name, rows) as record:`; rows can also be added to
+    record['rows'] inside the block once they are known. A stage entered several times
+    (once per chunk, say) adds up its times and rows and keeps the highest peak. The pipeline
+    stages (parse, split, compact, annotate, summarize) count per-machine entries as rows, so
+    their rows/s can be compared. CPU time
+    is that of the calling thread. With trace_memory, peak memory is what tracemalloc saw
+    allocated above the stage's starting point. Tracing is only switched on inside stages,
+    but it slows allocation-heavy stages down several times, so it can be left off.
+    """
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, rows=0):
+        record = self.stages.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': 0,
+                                               'peak_bytes': 0 if self.trace_memory else None, 'calls': 0})
+        started = self.trace_memory and not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = perf_counter(), thread_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] += perf_counter() - wall
+            record['cpu_seconds'] += thread_time() - cpu
+            if self.trace_memory:
+                record['peak_bytes'] = max(record['peak_bytes'], tracemalloc.get_traced_memory()[1] - base)
+            record['rows'] += rows
+            record['calls'] += 1
+            if started:
+                tracemalloc.stop()
+
+    def as_dict(self):
+        """ Returns the stages with rows per second added, for json.dump. """
+        return {name: dict(record, rows_per_second=record['rows'] / record['wall_seconds'] if record['wall_seconds'] else None)
+                for name, record in self.stages.items()}
+
+    def lines(self):
+        """ Returns one human-readable line per stage. """
+        lines = []
+        for name, record in self.as_dict().items():
+            rate = f" ({record['rows_per_second']:,.0f} rows/s)" if record['rows'] and record['rows_per_second'] else ""
+            peak = f", peak {record['peak_bytes'] / 2**20:.1f} MB" if record['peak_bytes'] is not None else ""
+            lines.append(f"{name}: {record['wall_seconds']:.3f} s wall, {record['cpu_seconds']:.3f} s CPU, "
+                         f"{record['rows']:,} rows{rate}{peak}")
+        return lines
+
+class CalculationCancelled(Exception):
+    """ Raised from a progress callback to stop a calculation. """
+
+def summarize_machine_data_incremental(file_path, schedule_dict, store_dir=None, progress=None, profile=None,
+                                       split=False, compact=False, with_ledger=False, with_cube=False):
+    """
+    Summarizes a machine CSV that grows by appending rows, reusing what earlier runs stored.
+
+    Complete days (every day before the last one in the file) are summarized once and stored
+    with the carry-over state at the end of the last of them; a later run only parses, annotates
+    and summarizes the lines appended since, then finishes a copy of the stored state with the
+    still-open last day. The file is read in blocks of STREAM_BLOCK_BYTES, holding back only
+    the rows of the newest day, so memory does not grow with the file. The result is identical
+    to summarizing the whole file. If the CSV was changed other than by appending, everything
+    is recomputed. Each schedule and choice of split and compact has a store of its own.
+
+    progress, if given, is called as progress("Summarizing", rows_done, rows_total) after each
+    block, rows_total being estimated from the bytes left to read. It may raise
+    CalculationCancelled to stop; nothing is stored then.
+    profile, a StageProfile, gets the parse, annotate and summarize stages, all counting
+    per-machine entries (not CSV lines) as rows. split and compact are passed to
+    prepare_machine_entries before entries are annotated. With with_ledger=True the results
+    include the JamLedger of every jam in the file, and with with_cube=True the SummaryCube,
+    as in SummaryState.results.
+
+    Returns:
+    - tuple: ((result, jam_count_by_shift, overall_jam_count), datetime_range)
+    """
+    schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+    store_dir = store_dir or os.path.join(default_cache_dir(), "incremental")
+    # Split or compacted entries give different days, so each mode keeps its own store
+    key = f"{os.path.abspath(file_path)}|{schedule.fingerprint()}|split={bool(split)}|compact={bool(compact)}"
+    store_path = os.path.join(store_dir, hashlib.blake2b(key.encode(), digest_size=16).hexdigest() + ".pkl")
+
+    loaded = _read_incremental_summary(store_path, file_path) if os.path.exists(store_path) else None
+    if loaded:
+        store, digest = loaded
+    else:
+        with open(file_path, 'rb') as file:
+            store = IncrementalSummary(file.readline())
+        digest = hashlib.blake2b(store.header, digest_size=20)
+        store.summary = SummaryState(schedule.shift_codes, by_day=True)
+
+    report = progress or (lambda stage, done, total: None)
+    stage = profile.stage if profile else (lambda name, rows=0: contextlib.nullcontext({'rows': 0}))
+    options = machine_csv_options(header_columns(store.header))
+    time_format = store.reader.time_format
+    total_bytes = max(os.path.getsize(file_path) - store.offset, 1)
+    read_bytes = rows = 0
+    # Rows of the newest day read so far, with their raw bytes, held back in case that day is still open
+    pending, pending_bytes, pending_starts = None, b'', np.zeros(0, dtype=np.int64)
+    persist, advanced = True, False
+
+    with open(file_path, 'rb') as file:
+        file.seek(store.offset)
+        for block in iter_line_blocks(file, partial=True):
+            with stage("parse") as record:
+                data = read_machine_block(store.header, block, options)
+                data['Time'], time_format = parse_time_column(data['Time'], time_format)
+                starts = line_starts(block)
+                # Quoted fields spanning lines would break the row to byte mapping; then nothing is stored
+                persist &= len(starts) == len(data)
+                read_bytes += len(block)
+                rows += len(data)
+                if pending is not None:
+                    data = pd.concat([pending, data], ignore_index=True)
+                    starts = np.concatenate((pending_starts, starts + len(pending_bytes)))
+                    block = pending_bytes + block
+
+                # Everything before the first row of the newest day is complete
+                row_days = np.where(data['Time'].notna(), to_epoch_ns(data['Time']) // NS_PER_DAY, -1)
+                cut = int(np.argmax(row_days == row_days.max())) if len(row_days) else 0
+                complete = store.reader.feed(data.iloc[:cut]) if cut else None
+                record['rows'] += len(complete) if complete is not None else 0
+
+            # Summarize the complete days into the store
+            if complete is not None:
+                complete = prepare_machine_entries(complete, schedule, split, compact, stage)
+            if complete is not None and len(complete):
+                with stage("annotate", len(complete)):
+                    annotated = update_machine_data(complete, schedule)
+                with stage("summarize", len(complete)):
+                    store.summary.update(annotated)
+            pending = data.iloc[cut:]
+            if persist:
+                consumed = int(starts[cut]) if len(starts) else len(block)
+                digest.update(block[:consumed])
+                store.offset += consumed
+                advanced |= consumed > 0
+                pending_bytes, pending_starts = block[consumed:], starts[cut:] - consumed
+            report("Summarizing", rows, max(rows, rows * total_bytes // read_bytes))
+
+    if persist and advanced:
+        store.prefix_digest = digest.hexdigest()
+        try:
+            os.makedirs(store_dir, exist_ok=True)
+            with open(f"{store_path}.tmp", 'wb') as file:
+                pickle.dump(store, file)
+            os.replace(f"{store_path}.tmp", store_path)
+        except OSError:
+            pass
+
+    # Finish a copy with the open last day and the final entries
+    summary = store.summary.fork()
+    reader = copy.deepcopy(store.reader)
+    with stage("parse") as record:
+        remaining = ([reader.feed(pending)] if pending is not None else []) + [reader.finish()]
+        record['rows'] += sum(map(len, remaining))
+    for entries in remaining:
+        entries = prepare_machine_entries(entries, schedule, split, compact, stage)
+        if len(entries):
+            with stage("annotate", len(entries)):
+                annotated = update_machine_data(entries, schedule)
+            with stage("summarize", len(entries)):
+                summary.update(annotated)
+    with stage("summarize"):
+        results = summary.results(with_ledger, with_cube)
+    report("Summarizing", rows, rows)
+    return results, reader.datetime_range
+
+class MachineTail:
+    """
+    Follows a machine CSV that is still being written, summarizing only the rows appended since
+    the last poll().
+
+    The MachineChunkReader keeps each machine's newest entry until a later row gives its
+    duration, and the SummaryState keeps the pending ERROR runs and skip flags, so the jam
+    state machine carries on from one poll to the next. results() at any time equals summarizing
+    the file as it stands, with the newest entries given the default duration as at the end of
+    any file. A line still being written is left for the next poll. Rows are read in blocks of
+    STREAM_BLOCK_BYTES, so the first poll of a long file does not hold all of it. If the file
+    shrinks or its header changes, it is read again from the start.
+    """
+
+    def __init__(self, file_path, schedule_dict, split=False, compact=False):
+        self.file_path = file_path
+        self.schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+        self.split = split
+        self.compact = compact
+        self.reset()
+
+    def reset(self):
+        """ Forgets everything read so far. """
+        self.header = None
+        self.offset = 0
+        self.reader = MachineChunkReader()
+        self.summary = SummaryState(self.schedule.shift_codes, by_day=True)
+
+    def poll(self, progress=None):
+        """
+        Summarizes the complete lines appended since the last poll and returns how many rows
+        were read. progress, if given, is called as progress("Summarizing", rows_done, rows_total)
+        after each block, rows_total being estimated from the bytes left to read; if it raises
+        CalculationCancelled the tail starts over on the next poll.
+        """
+        report = progress or (lambda stage, done, total: None)
+        with open(self.file_path, 'rb') as file:
+            header = file.readline()
+            if not header.endswith(b'\n'):
+                return 0  # The header itself is still being written
+            if header != self.header or os.fstat(file.fileno()).st_size < self.offset:
+                self.reset()
+                self.header = header
+                self.offset = len(header)
+            file.seek(self.offset)
+            total_bytes = max(os.fstat(file.fileno()).st_size - self.offset, 1)
+            read_bytes = rows = 0
+            options = machine_csv_options(header_columns(self.header))
+            try:
+                for block in iter_line_blocks(file):
+                    chunk = read_machine_block(self.header, block, options)
+                    entries = prepare_machine_entries(self.reader.feed(chunk), self.schedule, self.split, self.compact)
+                    if len(entries):
+                        self.summary.update(update_machine_data(entries, self.schedule))
+                    self.offset += len(block)
+                    read_bytes += len(block)
+                    rows += len(chunk)
+                    report("Summarizing", rows, max(rows, rows * total_bytes // read_bytes))
+            except BaseException:
+                self.reset()
+                raise
+        return rows
+
+    def results(self, with_ledger=False, with_cube=False):
+        """
+        Returns (results, datetime_range) for the rows read so far, in the form of
+        summarize_machine_data_streaming.
+        """
+        summary = self.summary.fork()
+        held = prepare_machine_entries(copy.deepcopy(self.reader).finish(), self.schedule, self.split, self.compact)
+        if len(held):
+            summary.update(update_machine_data(held, self.schedule))
+        return summary.results(with_ledger, with_cube), self.reader.datetime_range
+
+def period_bounds(start_day, start_time, end_day, end_time):
+    """
+    Converts a schedule period into (start, end) nanosecond offsets from Monday 00:00.
+
+    Periods ending earlier in the week than they start (e.g. Sunday -> Monday) end in
+    the following week, so 'end' can be up to two weeks out. Both ends are inclusive:
+    a shift ending at 17:30 still covers 17:30:00 but not 17:30:01.
+    """
+    start_index = WEEKDAY_INDEX[start_day]
+    end_index = WEEKDAY_INDEX[end_day]
+    if end_index < start_index:
+        end_index += 7
+
+    start = start_index * NS_PER_DAY + (start_time.hour * 60 + start_time.minute) * 60 * 10**9
+    end = end_index * NS_PER_DAY + (end_time.hour * 60 + end_time.minute) * 60 * 10**9
+    return start, end
+
+def in_period(offsets, start, end):
+    """ Returns whether each week offset (nanoseconds since Monday 00:00) falls inside the period from period_bounds. """
+    wrapped = offsets + NS_PER_WEEK
+    return ((offsets >= start) & (offsets <= end)) | ((wrapped >= start) & (wrapped <= end))
+
+NS_PER_MINUTE = 60 * 10**9
+MINUTES_PER_WEEK = 7 * 24 * 60
+
+class CompiledSchedule:
+    """
+    A shift schedule compiled into a minute-of-week lookup table.
+
+    Every minute of the week has two slots: one for the instant the minute starts and one
+    for the rest of the minute. Schedule times are whole minutes, so an entry's annotation
+    only changes at those instants (a shift ending at 17:30 still covers 17:30:00 but not
+    17:30:01). Each slot holds a label; per label we keep:
+    - annotations[label]: the tuple update_machine_data appends, e.g. ('SC:ShiftOne', 'break', 'SC:ShiftTwo')
+    - masks[label]: shift bitmask, bit i set for shift_codes[i]
+    - breaks[label]: True when the slot falls inside a break
+
+    table holds the label of each slot, shaped (2, 7 * 1440).
+    """
+
+    def __init__(self, schedule_dict):
+        # Flatten the schedule into (annotation, start, end) periods, keeping the dict order
+        periods = []
+        self.shift_codes = []
+        for shift, times in schedule_dict.items():
+            if 'breaks' in shift:
+                label = "break"
+            else:
+                label = f"SC:{shift}"
+                if shift not in self.shift_codes:
+                    self.shift_codes.append(shift)
+            for start_day, start_time, end_day, end_time in times:
+                periods.append((label, *period_bounds(start_day, start_time, end_day, end_time)))
+
+        if len(self.shift_codes) > 63:
+            raise ValueError("Schedules with more than 63 shift codes are not supported.")
+
+        # Representative instants: the start of each minute, and 1ns into it
+        minute_starts = np.arange(MINUTES_PER_WEEK, dtype=np.int64) * NS_PER_MINUTE
+        instants = np.stack([minute_starts, minute_starts + 1])
+
+        # One column per schedule period: does the instant fall inside it?
+        hits = np.zeros((instants.size, len(periods)), dtype=bool)
+        pattern_ids = np.zeros(instants.size, dtype=np.int64)
+        for column, (label, start, end) in enumerate(periods):
+            hits[:, column] = in_period(instants.reshape(-1), start, end)
+            # Fold the column into a per-slot pattern id, compacting it before it can overflow
+            pattern_ids = pattern_ids * 2 + hits[:, column]
+            if column % 32 == 31:
+                pattern_ids = pd.factorize(pattern_ids)[0]
+        pattern_ids = pd.factorize(pattern_ids)[0]
+
+        # Build the annotation once per distinct match pattern, from its first slot
+        self.annotations = []
+        pattern_labels = []
+        for row in np.unique(pattern_ids, return_index=True)[1]:
+            shifts_applied = []
+            for matched, (label, start, end) in zip(hits[row], periods):
+                # Only the first matching break is recorded
+                if matched and not (label == "break" and "break" in shifts_applied):
+                    shifts_applied.append(label)
+            # If no shifts or breaks are applied, the entry is a shift crossover
+            annotation = tuple(shifts_applied) or ("shiftcrossover",)
+            if annotation not in self.annotations:
+                self.annotations.append(annotation)
+            pattern_labels.append(self.annotations.index(annotation))
+
+        self.table = np.array(pattern_labels, dtype=np.int32)[pattern_ids].reshape(instants.shape)
+        self.masks = np.array([self._mask(annotation) for annotation in self.annotations], dtype=np.int64)
+        self.breaks = np.array(["break" in annotation for annotation in self.annotations])
+
+    def _mask(self, annotation):
+        mask = 0
+        for code in annotation:
+            if code.startswith("SC:"):
+                mask |= 1 << self.shift_codes.index(code[len("SC:"):])
+        return mask
+
+    def fingerprint(self):
+        """ Hash identifying what the schedule annotates, for keying stored results. """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.table.tobytes())
+        digest.update(repr((self.annotations, self.shift_codes)).encode())
+        return digest.hexdigest()
+
+    def lookup_timestamps(self, timestamps):
+        """ Returns the label for each timestamp (int64 wall-clock epoch nanoseconds). """
+        minutes = np.asarray(timestamps, dtype=np.int64) // NS_PER_MINUTE
+        within = minutes * NS_PER_MINUTE != timestamps
+        # 1970-01-01 was a Thursday, three days after the Monday the table starts on
+        minutes += 3 * 24 * 60
+        minutes %= MINUTES_PER_WEEK
+        return self.table.reshape(-1)[within * MINUTES_PER_WEEK + minutes]
+
+    def boundaries(self):
+        """
+        Returns the week offsets (nanoseconds since Monday 00:00, sorted) of the minutes whose
+        rest differs in label from the rest of the minute before: where a shift, break or
+        crossover starts or ends, for time spans rather than instants.
+        """
+        rest = self.table[1]
+        return np.flatnonzero(rest != np.roll(rest, 1)).astype(np.int64) * NS_PER_MINUTE
+
+def compact_machine_entries(machine_data, schedule_dict):
+    """
+    Merges each run of consecutive entries of a machine in the same state into one entry
+    holding the run's summed duration, so fewer rows go through annotation and summarizing.
+
+    Runs are also cut wherever update_machine_data would annotate the entries differently
+    (a shift, break or crossover starts or ends) and at midnight, so every merged entry has
+    one annotation and one day, and the jam summary comes out the same as for the full
+    entries (exactly so for whole-second timestamps; otherwise up to float rounding of the
+    summed durations). Annotations of machine_data are dropped; annotate the result.
+    """
+    schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+    timestamps = machine_data.timestamps
+    labels = schedule.lookup_timestamps(timestamps)
+    days = timestamps // NS_PER_DAY
+
+    starts = np.ones(len(timestamps), dtype=bool)
+    np.not_equal(machine_data.state_codes[1:], machine_data.state_codes[:-1], out=starts[1:])
+    starts[1:] |= labels[1:] != labels[:-1]
+    starts[1:] |= days[1:] != days[:-1]
+    first_rows = machine_data.offsets[:-1]
+    starts[first_rows[first_rows < len(starts)]] = True
+
+    run_starts = np.flatnonzero(starts)
+    durations = np.add.reduceat(machine_data.durations, run_starts) if len(run_starts) else np.zeros(0)
+    kept = np.concatenate(([0], np.cumsum(starts, dtype=np.int64)))
+    return MachineEntries(machine_data.machines, kept[machine_data.offsets], timestamps[run_starts],
+                          machine_data.state_codes[run_starts], machine_data.states, durations)
+
+def count_subsecond_entries(machine_data):
+    """
+    Returns how many entries have a timestamp that is not a whole second. compact_machine_entries
+    is exact only when this is 0: otherwise its summed durations can differ from the full entries
+    by float rounding, and so can a jam run that lands within rounding of the jam threshold.
+    """
+    return int(np.count_nonzero(machine_data.timestamps % 10**9))
+
+def split_machine_entries(machine_data, schedule_dict):
+    """
+    Cuts every entry whose span (its timestamp plus its duration) crosses a schedule boundary
+    into one entry per piece, so each piece is annotated, and its seconds charged, by the shift
+    or break it actually falls in rather than by where the entry started. This is what a finer
+    export with a row at every boundary would give.
+
+    A sweep over the weekly boundaries (CompiledSchedule.boundaries) finds, per entry, how many
+    boundaries its span crosses. A piece starts 1 ns after its boundary minute, the first instant
+    annotated as the period after it (schedule ends are inclusive); an entry starting exactly on
+    a boundary is likewise moved 1 ns on. The pieces of an entry keep its state and add up to
+    its duration; other entries are unchanged.
+
+    Jam detection then sees the pieces as entries, so an ERROR entry running into a break ends
+    its run there and only the in-shift part counts towards the jam threshold.
+    Annotations of machine_data are dropped; annotate the result.
+    """
+    schedule = schedule_dict if isinstance(schedule_dict, CompiledSchedule) else CompiledSchedule(schedule_dict)
+    bounds = schedule.boundaries()
+    if not len(bounds) or not len(machine_data):
+        return machine_data
+
+    # Boundaries before an instant, counting every week from the Monday before the epoch
+    monday = 3 * NS_PER_DAY  # 1970-01-01 was a Thursday
+    def boundaries_before(instants):
+        weeks, offsets = np.divmod(instants + monday, NS_PER_WEEK)
+        return weeks * len(bounds) + np.searchsorted(bounds, offsets)
+
+    starts = machine_data.timestamps
+    ends = starts + np.round(machine_data.durations * 1e9).astype(np.int64)
+    first = boundaries_before(starts)
+    # Only entries starting on a whole minute can start on a boundary; those move 1 ns on
+    on_minute = np.flatnonzero(starts % NS_PER_MINUTE == 0)
+    on_boundary = on_minute[boundaries_before(starts[on_minute] + 1) != first[on_minute]]
+    first[on_boundary] += 1
+    crossed = boundaries_before(ends)
+    crossed -= first
+    np.maximum(crossed, 0, out=crossed)
+
+    # One extra piece per boundary crossed; piece j of an entry starts just after boundary first + j
+    split_rows = np.flatnonzero(crossed)
+    counts = crossed[split_rows]
+    extra_rows = np.repeat(split_rows, counts)
+    group_starts = np.cumsum(counts) - counts
+    boundary = first[extra_rows] + np.arange(len(extra_rows)) - np.repeat(group_starts, counts)
+    weeks, index = np.divmod(boundary, len(bounds))
+    extra_timestamps = weeks * NS_PER_WEEK + bounds[index] - monday + 1
+
+    # Each piece runs to the next one; the last gets what is left of the entry's duration
+    durations = machine_data.durations.copy()
+    durations[split_rows] = (extra_timestamps[group_starts] - starts[split_rows]) / 1e9
+    extra_durations = np.empty(len(extra_rows), dtype=np.float64)
+    extra_durations[:-1] = np.diff(extra_timestamps) / 1e9
+    group_ends = group_starts + counts - 1
+    extra_durations[group_ends] = (machine_data.durations[split_rows]
+                                   - (extra_timestamps[group_ends] - starts[split_rows]) / 1e9)
+
+    timestamps = starts.copy()
+    timestamps[on_boundary] += 1
+    positions = extra_rows + 1
+    offsets = machine_data.offsets + np.searchsorted(extra_rows, machine_data.offsets)
+    return MachineEntries(machine_data.machines, offsets, np.insert(timestamps, positions, extra_timestamps),
+                          np.insert(machine_data.state_codes, positions, machine_data.state_codes[extra_rows]),
+                          machine_data.states, np.insert(durations, positions, extra_durations))
+
+def prepare_machine_entries(machine_data, schedule_dict, split=False, compact=False, stage=None):
+    """
+    Runs the optional stages between parsing and annotating: split_machine_entries when split
+    is set, then compact_machine_entries when compact is set. stage, if given, is a
+    StageProfile.stage to time them under "split" and "compact".
+    """
+    stage = stage or (lambda name, rows=0: contextlib.nullcontext({'rows': 0}))
+    if split and len(machine_data):
+        with stage("split", len(machine_data)):
+            machine_data = split_machine_entries(machine_data, schedule_dict)
+    if compact and len(machine_data):
+        with stage("compact", len(machine_data)):
+            machine_data = compact_machine_entries(machine_data, schedule_dict)
+    return machine_data
+
+def update_machine_data(machine_data, schedule_dict):
+    """
+    Annotates a MachineEntries with the shift bitmask of each entry and flags entries that fall
+    in a break (FLAG_BREAK) or outside every shift (FLAG_SHIFTCROSSOVER).
+
+    schedule_dict may be the output of process_shift_schedule_combined_dict or an
+    already compiled CompiledSchedule; each entry is then a single table lookup.
+    """
+    if isinstance(schedule_dict, CompiledSchedule):
+        schedule = schedule_dict
+    else:
+        schedule = CompiledSchedule(schedule_dict)
+
+    labels = schedule.lookup_timestamps(machine_data.timestamps)
+    shift_masks = schedule.masks[labels]
+    flags = np.where(schedule.breaks[labels], FLAG_BREAK, 0).astype(np.int8)
+    flags[(shift_masks == 0) & (flags == 0)] = FLAG_SHIFTCROSSOVER
+
+    return machine_data.with_annotations(shift_masks, flags, schedule.shift_codes)
@@ -0,0 +1,94 @@
+"""
+The original per-row annotation of Machine_State_Calculator-1.1.py, kept verbatim as the
+reference the vectorized update_machine_data is tested against.
+"""
+import pandas as pd
+
+def within_time_period(start_day, start_time, end_day, end_time, current_day, current_time):
+    # Dictionary mapping weekday names to their corresponding indices (0 for Monday, 1 for Tuesday, etc.)
+    weekdays = {"Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3, "Friday": 4, "Saturday": 5, "Sunday": 6}
+    
+    # Get the index of the start day, end day, and current day from the weekdays dictionary
+    start_index = weekdays[start_day]
+    end_index = weekdays[end_day]
+    current_index = weekdays[current_day]
+    
+    # Adjust the end index if it's before the start index to account for the next week
+    if end_index < start_index:
+        end_index += 7
+        
+    # Adjust the current index if it's before the start index to account for the next week
+    if current_index < start_index:
+        current_index += 7
+        
+    # Check if the current day falls within the specified period
+    is_within_day = start_index <= current_index <= end_index
+    
+    # If the current day is within the specified period
+    if is_within_day:
+        # If the start, current, and end days are the same
+        if start_index == current_index == end_index:
+            # Check if the current time is within the specified time range
+            return start_time <= current_time <= end_time
+        # If the current day is the start day
+        elif start_index == current_index:
+            # Check if the current time is after the start time
+            return current_time >= start_time
+        # If the current day is the end day
+        elif end_index == current_index:
+            # Check if the current time is before the end time
+            return current_time <= end_time
+        # If the current day is between the start and end days
+        else:
+            # Return True since any time during these days is within the specified period
+            return True
+    
+    # If the current day is not within the specified period
+    return False
+
+def update_machine_data(machine_data, schedule_dict):
+    """
+    Updates machine data with shift and break annotations, prepends 'SC:' to shift codes,
+    and appends 'shiftcrossover' to entries without shifts or breaks.
+    """
+    updated_data = {}  # Initialize an empty dictionary to store updated machine data
+    for machine_id, entries in machine_data.items():
+        updated_entries = []  # Initialize an empty list to store updated entries for the current machine
+        for entry in entries:
+            entry_dt, status, weekday, duration = entry
+            entry_dt = pd.to_datetime(entry_dt)  # Ensure the entry datetime is a pandas datetime object
+            
+            shifts_applied = []  # Initialize an empty list to store applied shifts
+            is_break_applied = False  # Initialize a flag to track if a break is applied
+            
+            # Check each shift and break in the schedule dictionary
+            for shift, times in schedule_dict.items():
+                for time_range in times:
+                    start_day, start_time, end_day, end_time = time_range
+                    # Check if the entry falls within the time range of the shift or break
+                    if within_time_period(start_day, start_time, end_day, end_time, weekday, entry_dt.time()):
+                        if 'breaks' in shift:
+                            # If a break is applied, add it to the list of applied shifts and set the flag
+                            if not is_break_applied:
+                                shifts_applied.append("break")
+                                is_break_applied = True
+                        else:
+                            # If a shift is applied, prepend 'SC:' to the shift code and add it to the list of applied shifts
+                            shifts_applied.append(f"SC:{shift}")
+
+            # Determine the annotation for the entry based on applied shifts and breaks
+            if shifts_applied:
+                # If any shifts or breaks are applied, extend the original tuple with them
+                updated_entry = entry + tuple(shifts_applied)
+            else:
+                # If no shifts or breaks are applied, append 'shiftcrossover' to the original tuple
+                updated_entry = entry + ("shiftcrossover",)
+
+            # Add the updated entry to the list of updated entries for the current machine
+            updated_entries.append(updated_entry)
+
+        # Add the list of updated entries for the current machine to the updated_data dictionary
+        updated_data[machine_id] = updated_entries
+
+    # Return the dictionary containing updated machine data
+    return updated_data
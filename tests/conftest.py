@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from generate_machine_data import generate_machine_csv
+from machine_state_core import parse_machine_data, process_shift_schedule_combined_dict, update_machine_data
+
+SCHEDULE_CSV = os.path.join(ROOT, 'test_data', 'test_schedules.csv')
+
+@pytest.fixture(scope='session')
+def machine_csv(tmp_path_factory):
+    """ Three weeks of three lines, with frequent jams and a few maintenance closures. """
+    file_path = tmp_path_factory.mktemp('data') / 'machine_data.csv'
+    generate_machine_csv(file_path, lines=3, years=21 / 365, jam_rate=1.5, closures_per_year=60,
+                         closure_hours=(1, 8), seed=7)
+    return str(file_path)
+
+@pytest.fixture(scope='session')
+def schedule_dict():
+    return process_shift_schedule_combined_dict(SCHEDULE_CSV)
+
+@pytest.fixture(scope='session')
+def machine_data(machine_csv):
+    return parse_machine_data(machine_csv)[0]
+
+@pytest.fixture(scope='session')
+def annotated(machine_data, schedule_dict):
+    return update_machine_data(machine_data, schedule_dict)
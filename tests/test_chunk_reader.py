@@ -0,0 +1,64 @@
+"""
+Tests of reading the machine CSV in blocks: entries read block by block, with each machine's
+last entry held back until the next block (MachineChunkReader), match the whole-file parse for
+any block size, and the streaming and incremental summaries match summarizing that parse.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import machine_state_core
+from machine_state_core import (iter_machine_data_chunks, summarize_machine_data_incremental,
+                                summarize_machine_data_streaming, summarize_machine_entries_with_exclusion)
+from test_summarizers import assert_same_results, plain
+
+@pytest.fixture(scope='module')
+def whole(annotated):
+    return summarize_machine_entries_with_exclusion(annotated, vectorized=True, with_ledger=True)
+
+@pytest.mark.parametrize('block_bytes', [1000, 50_000, 1 << 30])
+def test_chunks_match_whole_parse(machine_csv, machine_data, block_bytes):
+    chunks = [entries for entries, _ in iter_machine_data_chunks(machine_csv, block_bytes)]
+    expected = machine_data.to_tuples()
+    actual = {}
+    for entries in chunks:
+        for machine, rows in entries.to_tuples().items():
+            actual.setdefault(machine, []).extend(rows)
+    assert list(actual) == list(expected)
+    for machine, rows in expected.items():
+        assert len(actual[machine]) == len(rows)
+        for want, got in zip(rows, actual[machine]):
+            assert got[:3] == want[:3]
+            np.testing.assert_allclose(got[3], want[3])
+
+def test_streaming_matches_whole(machine_csv, schedule_dict, whole):
+    results, _ = summarize_machine_data_streaming(machine_csv, schedule_dict, 50_000, with_ledger=True)
+    assert_same_results(whole, results)
+
+def test_incremental_matches_whole(machine_csv, schedule_dict, whole, tmp_path, monkeypatch):
+    monkeypatch.setattr(machine_state_core, 'STREAM_BLOCK_BYTES', 50_000)
+    for run in range(2):
+        results, _ = summarize_machine_data_incremental(machine_csv, schedule_dict, tmp_path, with_ledger=True)
+        assert_same_results(whole, results)
+    assert list(tmp_path.iterdir())
+
+@pytest.fixture(scope='module')
+def subsecond_csv(machine_csv, tmp_path_factory):
+    """ The machine CSV with every timestamp moved up to a second on, where compacting rounds differently. """
+    data = pd.read_csv(machine_csv)
+    jitter = np.random.default_rng(5).integers(0, 1000, len(data))
+    data['Time'] = pd.to_datetime(data['Time']) + pd.to_timedelta(jitter, unit='ms')
+    file_path = tmp_path_factory.mktemp('subsecond') / 'machine_data.csv'
+    data.to_csv(file_path, index=False)
+    return str(file_path)
+
+@pytest.mark.parametrize('option', ['split', 'compact'])
+def test_incremental_store_follows_options(machine_csv, subsecond_csv, schedule_dict, tmp_path, option):
+    file_path = subsecond_csv if option == 'compact' else machine_csv
+    def run(store, enabled):
+        return summarize_machine_data_incremental(file_path, schedule_dict, tmp_path / store, **{option: enabled})[0]
+
+    fresh = {True: run('fresh-on', True), False: run('fresh-off', False)}
+    assert plain(fresh[True]) != plain(fresh[False])
+    for enabled in (False, True, False):
+        assert plain(run('shared', enabled)) == plain(fresh[enabled])
@@ -0,0 +1,65 @@
+"""
+Tests of the process-pool summarizers against the serial vectorized summary of the same entries,
+including ERROR runs that straddle the week and month boundaries time shards are cut at.
+"""
+import numpy as np
+import pytest
+
+from machine_state_core import (DEFAULT_DURATION_SECONDS, MachineEntries, summarize_machine_data_parallel,
+                                summarize_machine_data_time_sharded, summarize_machine_entries_with_exclusion,
+                                time_shard_bounds, update_machine_data)
+from test_summarizers import plain
+
+@pytest.fixture(scope='module')
+def serial(annotated):
+    return summarize_machine_entries_with_exclusion(annotated, vectorized=True, with_ledger=True)
+
+def assert_same_as_serial(actual, serial):
+    for expected, got in zip(serial[:3], actual[:3]):
+        assert plain(got) == plain(expected)
+    for column in ('offsets', 'starts', 'ends', 'durations', 'shift_masks'):
+        np.testing.assert_array_equal(getattr(actual[3], column), getattr(serial[3], column))
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_parallel_matches_serial(machine_data, schedule_dict, serial, max_workers):
+    actual = summarize_machine_data_parallel(machine_data, schedule_dict, max_workers, with_ledger=True)
+    assert_same_as_serial(actual, serial)
+
+def boundary_errors(widths):
+    """
+    Ten weeks of ten-minute entries per machine, in ERROR for widths[machine] minutes either side
+    of every Monday 00:00 and every 1st of the month, so an ERROR run straddles every week and
+    month shard boundary; short runs are jams, runs past the jam threshold are not.
+    """
+    timestamps = np.arange(np.datetime64('2024-01-03T12:00'), np.datetime64('2024-03-13T12:00'),
+                           np.timedelta64(10, 'm')).astype('datetime64[ns]')
+    days = timestamps.astype('datetime64[D]')
+    edges = np.unique(np.concatenate([days[(days.astype(np.int64) + 3) % 7 == 0],
+                                      days[days == days.astype('datetime64[M]').astype('datetime64[D]')]]))
+    edges = edges.astype('datetime64[ns]')
+    distance = np.abs(timestamps[:, None] - edges[None, :]).min(axis=1)
+
+    timestamps = timestamps.astype(np.int64)
+    durations = np.append(np.diff(timestamps) / 1e9, DEFAULT_DURATION_SECONDS)
+    columns = {machine: (timestamps, np.where(distance <= np.timedelta64(width, 'm'), 'ERROR', 'RUNNING'), durations)
+               for machine, width in widths.items()}
+    return MachineEntries.from_columns(columns)
+
+@pytest.mark.parametrize('period', ['W', 'M'])
+def test_time_shards_match_serial_across_error_runs(schedule_dict, period):
+    entries = boundary_errors({'long': 90, 'short': 20})
+    error_id = entries.states.index('ERROR')
+    rows = entries.rows('long')
+    bounds = time_shard_bounds(entries.timestamps[rows], entries.state_codes[rows], error_id, period)
+    assert len(bounds) > 1
+    assert not np.isin(entries.state_codes[rows][bounds], [error_id]).any()
+
+    serial = summarize_machine_entries_with_exclusion(update_machine_data(entries, schedule_dict), vectorized=True,
+                                                      with_ledger=True)
+    assert serial[2]['short'] > 0
+    actual = summarize_machine_data_time_sharded(entries, schedule_dict, period, 2, with_ledger=True)
+    assert_same_as_serial(actual, serial)
+
+def test_time_shards_match_serial(machine_data, schedule_dict, serial):
+    actual = summarize_machine_data_time_sharded(machine_data, schedule_dict, 'W', 1, with_ledger=True)
+    assert_same_as_serial(actual, serial)
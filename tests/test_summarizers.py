@@ -0,0 +1,69 @@
+"""
+Differential tests of the jam summary on generated data: annotation against the original
+per-row update_machine_data, and the vectorized summarizer against the entry-by-entry loop
+of summarize_machine_entries_with_exclusion, over the whole data and day by day.
+"""
+import numpy as np
+import pytest
+
+from baseline_pipeline import update_machine_data as baseline_update_machine_data
+from machine_state_core import NS_PER_DAY, SummaryState, summarize_machine_entries_with_exclusion
+
+def plain(value):
+    """ Turns the nested defaultdicts of a result into plain dicts, for comparing with ==. """
+    return {key: plain(item) for key, item in value.items()} if isinstance(value, dict) else value
+
+def summarize_both(entries):
+    loop = summarize_machine_entries_with_exclusion(entries, with_ledger=True)
+    vectorized = summarize_machine_entries_with_exclusion(entries, vectorized=True, with_ledger=True)
+    return loop, vectorized
+
+def assert_same_results(loop, vectorized):
+    for expected, actual in zip(loop[:3], vectorized[:3]):
+        assert plain(actual) == plain(expected)
+    for column in ('offsets', 'starts', 'ends', 'durations', 'shift_masks'):
+        np.testing.assert_array_equal(getattr(vectorized[3], column), getattr(loop[3], column))
+
+def test_annotation_matches_baseline(machine_data, schedule_dict, annotated):
+    expected = baseline_update_machine_data(machine_data.to_tuples(), schedule_dict)
+    actual = annotated.to_tuples()
+    assert list(actual) == list(expected)
+    for machine, entries in expected.items():
+        assert len(actual[machine]) == len(entries)
+        for want, got in zip(entries, actual[machine]):
+            # The store keeps shift codes in schedule order rather than the order they matched
+            assert got[:4] == want[:4]
+            assert sorted(got[4:]) == sorted(want[4:])
+
+def test_vectorized_matches_loop(annotated):
+    loop, vectorized = summarize_both(annotated)
+    assert sum(loop[2].values()) > 0
+    assert_same_results(loop, vectorized)
+
+def test_vectorized_matches_loop_by_day(annotated):
+    days = annotated.timestamps // NS_PER_DAY
+    for day in np.unique(days):
+        assert_same_results(*summarize_both(annotated.take(days == day)))
+
+def test_cube_days_add_up_to_loop(annotated):
+    loop = summarize_machine_entries_with_exclusion(annotated)
+    cube = summarize_machine_entries_with_exclusion(annotated, with_cube=True)[3]
+    result, jam_count_by_shift, overall_jam_count = cube.results()
+    assert plain(jam_count_by_shift) == plain(loop[1])
+    assert plain(overall_jam_count) == plain(loop[2])
+    assert plain(result).keys() == plain(loop[0]).keys()
+    for shift, machines in loop[0].items():
+        for machine, states in machines.items():
+            assert dict(result[shift][machine]) == pytest.approx(dict(states))
+
+def test_cube_fed_day_by_day(annotated):
+    whole = SummaryState(annotated.shift_codes, by_day=True)
+    whole.update(annotated)
+    daily = SummaryState(annotated.shift_codes, by_day=True)
+    days = annotated.timestamps // NS_PER_DAY
+    for day in np.unique(days):
+        daily.update(annotated.take(days == day))
+    expected, actual = whole.cube(), daily.cube()
+    assert actual.first_day == expected.first_day
+    for array in ('seconds', 'counts', 'jams_by_shift', 'jams'):
+        np.testing.assert_array_equal(getattr(actual, array), getattr(expected, array))